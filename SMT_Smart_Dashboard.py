@@ -25,24 +25,17 @@ utils.load_style()
 
 # 5. 스마트 헤더 렌더링 (타이틀 + 유저정보 + 로그아웃)
 utils.render_header()
-
-# 6. 메인 탭 구성
-tab_dashboard, tab_prod, tab_maint, tab_daily = st.tabs([
-    "📊 대시보드",
-    "🏭 생산관리",
-    "🛠 설비보전",
-    "📋 일일점검"
-])
-
-# 7. 각 탭별 화면 렌더링 (utils에 있는 함수 호출)
-with tab_dashboard:
-    utils.render_dashboard()
-
-with tab_prod:
-    utils.render_production()
-
-with tab_maint:
-    utils.render_maintenance()
-
-with tab_daily:
-    utils.render_daily_check()
\ No newline at end of file
+utils.show_write_failures()  # 백그라운드 저장 실패 알림
+
+# 6. 메인 화면 선택 (st.tabs는 모든 탭을 매번 실행하므로, 선택한 화면만 실행하고 데이터도 그 화면 것만 로딩)
+VIEWS = {
+    "📊 대시보드": utils.render_dashboard,
+    "🏭 생산관리": utils.render_production,
+    "🛠 설비보전": utils.render_maintenance,
+    "📋 일일점검": utils.render_daily_check,
+}
+utils.keep_view_state()  # 다른 화면에 입력 중이던 값 유지
+view = st.radio("화면 선택", list(VIEWS), key="main_view", horizontal=True, label_visibility="collapsed")
+
+# 7. 선택된 화면 렌더링 (utils에 있는 함수 호출)
+VIEWS[view]()
\ No newline at end of file
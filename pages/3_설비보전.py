@@ -4,11 +4,13 @@ import pandas as pd
 import time
 from datetime import timedelta
 import altair as alt
-from gspread_dataframe import get_as_dataframe
 
 st.set_page_config(page_title="설비보전", page_icon="🛠", layout="wide")
 utils.check_auth_status()
 utils.render_sidebar()
+utils.show_write_failures()
+utils.prefetch(utils.SHEET_EQUIPMENT, utils.SHEET_MAINTENANCE)
+if st.session_state.user_info['role'] == 'admin': utils.ensure_row_ids(utils.SHEET_MAINTENANCE)  # 수정/삭제 화면용
 
 t1, t2, t3 = st.tabs(["📝 정비 등록", "📋 이력 조회", "📊 분석 리포트"])
 
@@ -18,8 +20,7 @@ with t1:
         if st.session_state.user_info['role'] in ['admin', 'worker']:
             with st.container(border=True):
                 st.markdown("#### 🔧 정비 등록")
-                eq_df = utils.load_data(utils.SHEET_EQUIPMENT, utils.COLS_EQUIPMENT)
-                eq_map = dict(zip(eq_df['id'], eq_df['name'])) if not eq_df.empty else {}
+                eq_map = utils.get_equipment_map()  # 설비 id → 설비명 (기준정보 버전별, 세션 간 공유)
                 f_date = st.date_input("날짜", key="maint_date", value=utils.get_now())
                 f_eq = st.selectbox("설비", list(eq_map.keys()), format_func=lambda x: f"[{x}] {eq_map[x]}")
                 f_type = st.selectbox("구분", ["PM (예방)", "BM (고장)", "CM (개선)"])
@@ -67,44 +68,49 @@ with t1:
             if st.session_state.user_info['role'] == 'admin':
                 df_display = df.sort_values("입력시간", ascending=False).head(50)
                 df_display.insert(0, "삭제", False)
-                edited_df = st.data_editor(df_display, hide_index=True, use_container_width=True, column_config={"삭제": st.column_config.CheckboxColumn(required=True), "입력시간": st.column_config.TextColumn(disabled=True)}, disabled=["입력시간"], key="maint_editor")
+                edited_df = st.data_editor(df_display, hide_index=True, use_container_width=True, column_config={"삭제": st.column_config.CheckboxColumn(required=True), "입력시간": st.column_config.TextColumn(disabled=True), **utils.TABLE_CONFIG}, disabled=["입력시간", utils.COL_ID], key="maint_editor")
                 
                 c_btn1, c_btn2 = st.columns(2)
                 with c_btn1:
                     if st.button("선택 항목 삭제", type="secondary", key="del_maint"):
                         to_delete = edited_df[edited_df["삭제"] == True]
                         if not to_delete.empty:
-                            try:
-                                ws = utils.get_worksheet(utils.SHEET_MAINTENANCE)
-                                all_data = get_as_dataframe(ws)
-                                for t in to_delete['입력시간']:
-                                    idx_to_drop = all_data[all_data['입력시간'].astype(str) == str(t)].index
-                                    all_data = all_data.drop(idx_to_drop)
-                                utils.save_data(all_data, utils.SHEET_MAINTENANCE)
+                            if utils.delete_rows(utils.SHEET_MAINTENANCE, to_delete[utils.COL_ID].tolist()):
                                 st.success("삭제 완료")
                                 st.rerun()
-                            except Exception as e: st.error(f"오류: {e}")
+                            else: st.error("삭제 실패")
                 with c_btn2:
                     if st.button("수정사항 저장", type="primary", key="save_maint"):
-                        try:
-                            ws = utils.get_worksheet(utils.SHEET_MAINTENANCE)
-                            all_data = get_as_dataframe(ws)
-                            all_data['입력시간'] = all_data['입력시간'].astype(str)
-                            for index, row in edited_df.iterrows():
-                                if row['삭제']: continue
-                                match_idx = all_data[all_data['입력시간'] == str(row['입력시간'])].index
-                                if not match_idx.empty:
-                                    for col in utils.COLS_MAINTENANCE:
-                                        if col != '입력시간': all_data.at[match_idx[0], col] = row[col]
-                            utils.save_data(all_data, utils.SHEET_MAINTENANCE)
-                            st.success("저장 완료")
-                            st.rerun()
-                        except Exception as e: st.error(f"저장 오류: {e}")
-            else: st.dataframe(df.sort_values("입력시간", ascending=False).head(20), hide_index=True, use_container_width=True)
+                        editable = [c for c in utils.COLS_MAINTENANCE if c not in ("입력시간", "수정자", "수정시간", utils.COL_ID)]
+                        changes = utils.diff_rows(df_display, edited_df[edited_df["삭제"] != True], editable)
+                        n_cells = sum(len(c) for c in changes.values())
+                        if n_cells == 0: st.info("변경된 내용이 없습니다.")
+                        else:
+                            stamp = {"수정자": st.session_state.user_info['id'], "수정시간": str(utils.get_now())}
+                            for c in changes.values(): c.update(stamp)
+                            if utils.update_rows(utils.SHEET_MAINTENANCE, changes):
+                                st.success(f"저장 완료 ({n_cells}개 셀 수정)")
+                                st.rerun()
+                            else: st.error("저장 오류")
+            else: st.dataframe(df.sort_values("입력시간", ascending=False).head(20), hide_index=True, use_container_width=True, column_config=utils.TABLE_CONFIG)
 
 with t2:
-    df = utils.load_data(utils.SHEET_MAINTENANCE, utils.COLS_MAINTENANCE)
-    st.dataframe(df, use_container_width=True)
+    today = utils.get_now().date()
+    c_d, c_s = st.columns([1, 2])
+    h_range = c_d.date_input("조회 기간", value=(today - timedelta(days=90), today), key="maint_hist_range")
+    if isinstance(h_range, tuple) and len(h_range) == 2:
+        df = utils.load_data(utils.SHEET_MAINTENANCE, utils.COLS_MAINTENANCE)
+        df = df[(df['날짜'] >= pd.Timestamp(h_range[0])) & (df['날짜'] <= pd.Timestamp(h_range[1]))]
+        st.dataframe(df.sort_values('날짜', ascending=False), use_container_width=True, column_config=utils.TABLE_CONFIG)
+
+        # 엑셀 내보내기: 화면 표를 복사하지 않고 기간 전체를 파일로 (대용량도 청크 단위로 기록)
+        labels = {v[1]: k for k, v in utils.EXPORT_SHEETS.items()}
+        sel = c_s.multiselect("내보낼 데이터", list(labels), default=[utils.EXPORT_SHEETS[utils.SHEET_MAINTENANCE][1]], key="export_sheets")
+        if sel and st.button("📥 엑셀 파일 만들기"):
+            with st.spinner("엑셀 생성 중..."):
+                xlsx = utils.export_excel([labels[s] for s in sel], h_range[0], h_range[1])
+            st.download_button("다운로드", xlsx, file_name=f"SMT_{h_range[0]}_{h_range[1]}.xlsx",
+                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
 with t3:
     st.markdown("#### 📊 보전 분석 리포트")
@@ -112,8 +118,6 @@ with t3:
     if st.button("보전 분석 실행"):
         df = utils.load_data(utils.SHEET_MAINTENANCE, utils.COLS_MAINTENANCE)
         if not df.empty:
-            df['비가동시간'] = pd.to_numeric(df['비가동시간'], errors='coerce').fillna(0)
-            
             top_down = df.groupby('설비명')['비가동시간'].sum().sort_values(ascending=False).head(3)
             top_down_display = top_down.astype(int).reset_index()
             top_down_display.columns = ['설비명', '비가동시간(분)']
@@ -136,8 +140,7 @@ with t3:
 
             st.markdown("---")
             st.subheader("💰 유형별 정비 비용 분석")
-            df['비용'] = pd.to_numeric(df['비용'], errors='coerce').fillna(0)
-            cost_agg = df.groupby('작업구분')['비용'].sum().reset_index()
+            cost_agg = df.groupby('작업구분', observed=True)['비용'].sum().reset_index()
             
             base = alt.Chart(cost_agg).encode(x=alt.X('작업구분', sort='-y'), y='비용', color='작업구분')
             bars = base.mark_bar(cornerRadiusTopLeft=10, cornerRadiusTopRight=10).encode(tooltip=['비용'])
@@ -7,6 +7,35 @@ import streamlit.components.v1 as components
 st.set_page_config(page_title="일일점검", page_icon="✅", layout="wide")
 utils.check_auth_status()
 utils.render_sidebar()
+utils.show_write_failures()
+utils.prefetch(utils.SHEET_CHECK_MASTER, utils.SHEET_CHECK_RESULT)
+
+# 설비 1개 점검 블록: 입력 변경 시 이 블록만 다시 실행 (라인 전체를 다시 그리지 않음)
+@utils.fragment
+def check_block(equip_name, items, prev_data, sel_date, is_viewer):
+    with st.container(border=True):
+        st.markdown(f"**🛠 {equip_name}**")
+        for row in items:
+            uid = row['uid']
+            c1, c2, c3 = st.columns([2, 2, 1])
+            c1.markdown(f"**{row['item_name']}**\n<span style='color:gray;font-size:0.9em'>{row['check_content']}</span>", unsafe_allow_html=True)
+            
+            key_val = f"v_{uid}_{sel_date}"
+            key_memo = f"m_{uid}_{sel_date}"
+            prev = prev_data.get(uid, {})
+            
+            is_ng_condition = False
+            with c2:
+                if row['check_type'] == 'OX':
+                    curr_val = st.radio("판정", ["OK", "NG"], key=key_val, horizontal=True, label_visibility="collapsed", index=0 if prev.get('ox')=='OK' else 1 if prev.get('ox')=='NG' else 0, disabled=is_viewer)
+                    if curr_val == 'NG': is_ng_condition = True
+                else:
+                    curr_val = st.number_input("수치", key=key_val, step=0.1, value=float(prev.get('value')) if prev.get('value') and str(prev.get('value')).replace('.','',1).isdigit() else None, disabled=is_viewer)
+                    if curr_val is not None and utils.check_out_of_range(row, curr_val): is_ng_condition = True
+                
+                if is_ng_condition:
+                    st.text_input("📝 불량 사유 / 조치 내역", value=prev.get('비고', ''), key=key_memo, placeholder="사유 입력")
+            with c3: st.caption(f"기준: {row['standard']}")
 
 t1, t2, t3 = st.tabs(["✍ 점검 입력", "📊 현황", "📄 리포트"])
 
@@ -19,70 +48,26 @@ with t1:
     with c_date:
         sel_date = st.date_input("점검 일자", utils.get_now(), key="check_date_input")
     
-    df_res = utils.load_data(utils.SHEET_CHECK_RESULT, utils.COLS_CHECK_RESULT)
-    df_master = utils.load_data(utils.SHEET_CHECK_MASTER, utils.COLS_CHECK_MASTER)
+    lines = utils.check_lines()  # 점검 양식은 기준정보 버전별로 한 번 컴파일해 세션 간 공유
     
-    if df_master.empty: st.warning("점검 항목이 없습니다.")
+    if not lines: st.warning("점검 항목이 없습니다.")
     else:
-        lines = df_master['line'].unique()
         with c_line: sel_line = st.selectbox("라인 선택", lines)
         
-        line_data = df_master[df_master['line'] == sel_line]
-        total_items = len(line_data)
-        checked_count = 0
-        
-        if not df_res.empty:
-            df_res['date_only'] = df_res['date'].astype(str).str.split().str[0]
-            status_df = df_res[(df_res['date_only'] == str(sel_date)) & (df_res['line'] == sel_line)]
-            if not status_df.empty:
-                checked_count = len(status_df.drop_duplicates(['equip_id', 'item_name']))
+        groups = utils.get_check_items(sel_line)
+        total_items = sum(len(items) for _, items in groups)
+        # 항목별 최신 점검 결과 (색인 조회: 이력 길이와 무관)
+        prev_data = utils.latest_checks(sel_date, sel_line)
+        checked_count = len(prev_data)
 
         if checked_count == 0: st.error(f"❌ {sel_date} : 점검 미실시 (0/{total_items})")
         elif checked_count < total_items: st.warning(f"⚠️ {sel_date} : 점검 진행 중 ({checked_count}/{total_items})")
         else: st.success(f"✅ {sel_date} : 점검 완료 ({checked_count}/{total_items})")
 
-        prev_data = {}
-        if not df_res.empty:
-            df_filtered = df_res[(df_res['date_only'] == str(sel_date)) & (df_res['line'] == sel_line)]
-            if not df_filtered.empty:
-                df_filtered = df_filtered.sort_values('timestamp').drop_duplicates(['equip_id', 'item_name'], keep='last')
-                for _, r in df_filtered.iterrows():
-                    prev_data[f"{r['equip_id']}_{r['item_name']}"] = {'val': r['value'], 'ox': r['ox'], 'memo': r.get('비고', '')}
-
         st.markdown(f"##### 📝 {sel_line} 점검 입력")
         is_viewer = st.session_state.user_info['role'] == 'viewer'
 
-        for equip_name, group in line_data.groupby("equip_name", sort=False):
-            with st.container(border=True):
-                st.markdown(f"**🛠 {equip_name}**")
-                for _, row in group.iterrows():
-                    uid = f"{row['equip_id']}_{row['item_name']}"
-                    c1, c2, c3 = st.columns([2, 2, 1])
-                    c1.markdown(f"**{row['item_name']}**\n<span style='color:gray;font-size:0.9em'>{row['check_content']}</span>", unsafe_allow_html=True)
-                    
-                    key_val = f"v_{uid}_{sel_date}"
-                    key_memo = f"m_{uid}_{sel_date}"
-                    prev = prev_data.get(uid, {})
-                    
-                    is_ng_condition = False
-                    with c2:
-                        if row['check_type'] == 'OX':
-                            curr_val = st.radio("판정", ["OK", "NG"], key=key_val, horizontal=True, label_visibility="collapsed", index=0 if prev.get('ox')=='OK' else 1 if prev.get('ox')=='NG' else 0, disabled=is_viewer)
-                            if curr_val == 'NG': is_ng_condition = True
-                        else:
-                            curr_val = st.number_input("수치", key=key_val, step=0.1, value=float(prev.get('val')) if prev.get('val') and str(prev.get('val')).replace('.','',1).isdigit() else None, disabled=is_viewer)
-                            if curr_val is not None:
-                                try:
-                                    v_f = float(curr_val)
-                                    mn = float(row['min_val']) if row['min_val'] != "" else None
-                                    mx = float(row['max_val']) if row['max_val'] != "" else None
-                                    if mn is not None and v_f < mn: is_ng_condition = True
-                                    if mx is not None and v_f > mx: is_ng_condition = True
-                                except: pass
-                        
-                        if is_ng_condition:
-                            st.text_input("📝 불량 사유 / 조치 내역", value=prev.get('memo', ''), key=key_memo, placeholder="사유 입력")
-                    with c3: st.caption(f"기준: {row['standard']}")
+        for equip_name, items in groups: check_block(equip_name, items, prev_data, sel_date, is_viewer)
         
         st.markdown("---")
         signer = st.text_input("점검자", value=st.session_state.user_info['name'], disabled=is_viewer)
@@ -90,8 +75,8 @@ with t1:
         if not is_viewer and st.button(f"💾 {sel_line} 저장", type="primary", use_container_width=True):
             rows_to_add = []
             now_ts = str(utils.get_now())
-            for _, row in line_data.iterrows():
-                uid = f"{row['equip_id']}_{row['item_name']}"
+            for row in (r for _, items in groups for r in items):
+                uid = row['uid']
                 key_val = f"v_{uid}_{sel_date}"
                 key_memo = f"m_{uid}_{sel_date}"
                 
@@ -104,14 +89,7 @@ with t1:
                     if row['check_type'] == 'OX':
                         final_ox = val
                         final_val = ""
-                    else:
-                        try:
-                            v_num = float(val)
-                            mn = float(row['min_val']) if row['min_val'] != '' else None
-                            mx = float(row['max_val']) if row['max_val'] != '' else None
-                            if mn is not None and v_num < mn: final_ox = "NG"
-                            if mx is not None and v_num > mx: final_ox = "NG"
-                        except: pass
+                    elif utils.check_out_of_range(row, val): final_ox = "NG"
                     rows_to_add.append([str(sel_date), sel_line, row['equip_id'], row['item_name'], final_val, final_ox, signer, now_ts, memo])
             
             if rows_to_add:
@@ -123,11 +101,13 @@ with t1:
 
 with t3:
     st.markdown("#### 📄 일일점검 리포트 출력")
-    c_r1, c_r2 = st.columns([1, 2])
+    c_r1, c_r2, c_r3 = st.columns([1, 1, 1])
     report_date = c_r1.date_input("리포트 날짜", utils.get_now(), key="daily_report_date")
-    if c_r2.button("PDF 생성"):
+    report_line = c_r2.selectbox("라인", ["전체"] + list(utils.check_lines()), key="daily_report_line")
+    if c_r3.button("PDF 생성"):
         with st.spinner("생성 중..."):
-            pdf_bytes = utils.generate_all_daily_check_pdf(str(report_date))
+            pdf_bytes = utils.daily_check_report_pdf(report_date, None if report_line == "전체" else report_line)
             if pdf_bytes:
-                st.download_button("📥 PDF 다운로드", pdf_bytes, file_name=f"Daily_Check_{report_date}.pdf", mime="application/pdf")
-            else: st.error("오류 발생")
\ No newline at end of file
+                suffix = "" if report_line == "전체" else f"_{report_line}"
+                st.download_button("📥 PDF 다운로드", pdf_bytes, file_name=f"Daily_Check_{report_date}{suffix}.pdf", mime="application/pdf")
+            else: st.warning("점검 데이터 없음")
\ No newline at end of file
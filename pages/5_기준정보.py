@@ -1,12 +1,15 @@
 import streamlit as st
 import utils
+import pandas as pd
 
 st.set_page_config(page_title="기준정보", page_icon="⚙", layout="wide")
 utils.check_auth_status()
 utils.render_sidebar()
+utils.show_write_failures()
+utils.prefetch(utils.SHEET_ITEMS, utils.SHEET_EQUIPMENT, utils.SHEET_CHECK_MASTER)
 
 if st.session_state.user_info['role'] == 'admin':
-    t1, t2, t3 = st.tabs(["📦 품목 기준정보", "🏭 설비 기준정보", "✅ 일일점검 기준정보"])
+    t1, t2, t3, t4 = st.tabs(["📦 품목 기준정보", "🏭 설비 기준정보", "✅ 일일점검 기준정보", "🗄 데이터 보관"])
     with t1:
         st.markdown("#### 품목 마스터 관리")
         df = utils.load_data(utils.SHEET_ITEMS, utils.COLS_ITEMS)
@@ -28,5 +31,27 @@ if st.session_state.user_info['role'] == 'admin':
         if st.button("점검 기준 저장"): 
             utils.save_data(edited, utils.SHEET_CHECK_MASTER)
             st.rerun()
+    with t4:
+        st.markdown("#### 월별 데이터 보관 (아카이브)")
+        st.caption(f"이번 달과 지난 {utils.ARCHIVE_KEEP_MONTHS}개월을 제외한 행을 월별 파티션 시트로 옮깁니다. 기간 조회는 파티션을 함께 읽습니다.")
+        for sheet in utils.ARCHIVE_SHEETS:
+            months = utils.partition_months(sheet)
+            st.write(f"**{sheet}** : 보관된 월 {len(months)}개" + (f" ({months[0]} ~ {months[-1]})" if months else ""))
+        if st.button("지난 월 보관 실행", type="primary"):
+            with st.spinner("보관 중..."):
+                moved = {sheet: utils.archive_closed_months(sheet) for sheet in utils.ARCHIVE_SHEETS}
+            st.success(", ".join(f"{k}: {v}행" for k, v in moved.items()))
+
+        st.markdown("---")
+        st.markdown("#### 월간 감사 바인더")
+        st.caption("한 달치 일일 생산 보고서와 일일점검 보고서 PDF를 zip 하나로 묶습니다.")
+        this_month = utils.get_now().date().replace(day=1)
+        binder_months = [str((pd.Timestamp(this_month) - pd.DateOffset(months=i)).to_period("M")) for i in range(12)]
+        b_month = st.selectbox("대상 월", binder_months, index=1)
+        if st.button("바인더 생성"):
+            with st.spinner("보고서 생성 중..."):
+                binder = utils.month_report_binder(b_month)
+            if binder: st.download_button("📥 zip 다운로드", binder, file_name=f"Audit_{b_month}.zip", mime="application/zip")
+            else: st.warning("해당 월 데이터 없음")
 else:
     st.error("🚫 접근 권한이 없습니다. (관리자 전용)")
\ No newline at end of file
@@ -0,0 +1,19 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def sqlite_env(tmp_path, monkeypatch):
+    """get_backend/get_store를 임시 SQLite 저장소와 새 SheetStore로 교체 (Streamlit 캐시와 데이터 버전도 초기화)"""
+    st = pytest.importorskip("streamlit")
+    utils = pytest.importorskip("utils")
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    backend, store = utils.SQLiteBackend(str(tmp_path / "t.db")), utils.SheetStore()
+    monkeypatch.setattr(utils, "get_backend", lambda: backend)
+    monkeypatch.setattr(utils, "get_store", lambda: store)
+    return backend, store
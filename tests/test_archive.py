@@ -0,0 +1,39 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("streamlit")
+utils = pytest.importorskip("utils")
+
+
+def _rec(day, rid, qty=10):
+    r = {"날짜": day, "구분": "PC", "품목코드": "A", "제품명": "a", "수량": str(qty), "입력시간": f"{day} 09:00:00", "작성자": "u", utils.COL_ID: rid}
+    return [r.get(c, "") for c in utils.COLS_RECORDS]
+
+
+def test_query_range_dedupes_on_record_id(sqlite_env):
+    backend, store = sqlite_env
+    part = utils.partition_name(utils.SHEET_RECORDS, "2026-01")
+    # 같은 날 같은 내용의 실적 두 건 (ID가 다름) + 보관 도중 중단되어 hot 시트에도 남은 행
+    backend.append([_rec("2026-01-05", "a1"), _rec("2026-01-05", "a2"), _rec("2026-01-06", "a3")], part, utils.COLS_RECORDS)
+    backend.append([_rec("2026-01-06", "a3"), _rec("2026-10-01", "b1")], utils.SHEET_RECORDS, utils.COLS_RECORDS)
+    df = utils.query_range(utils.SHEET_RECORDS, "2026-01-01", "2026-01-31")
+    assert sorted(df[utils.COL_ID]) == ["a1", "a2", "a3"]
+    assert df["수량"].sum() == 30
+
+
+def test_analysis_sees_rows_added_outside_utils(sqlite_env):
+    backend, store = sqlite_env
+    backend.append([_rec("2026-10-01", "a1")], utils.SHEET_RECORDS, utils.COLS_RECORDS)
+    assert utils.analyze_production("2026-10-01", "2026-10-31")["total"] == 10
+    backend.append([_rec("2026-10-02", "a2", 5)], utils.SHEET_RECORDS, utils.COLS_RECORDS)  # 다른 인스턴스에서 추가
+    store.sheets[utils.SHEET_RECORDS]["checked"] = 0
+    assert utils.analyze_production("2026-10-01", "2026-10-31")["total"] == 15
+
+
+def test_month_report_binder_renders_in_process(sqlite_env):
+    import io, zipfile
+    backend, store = sqlite_env
+    backend.append([_rec("2026-10-01", "a1"), _rec("2026-10-03", "a2")], utils.SHEET_RECORDS, utils.COLS_RECORDS)
+    names = zipfile.ZipFile(io.BytesIO(utils.month_report_binder("2026-10"))).namelist()
+    assert names == ["Production_2026-10-01.pdf", "Production_2026-10-03.pdf"]
+    assert utils.month_report_binder("2026-09") is None
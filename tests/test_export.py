@@ -0,0 +1,26 @@
+import io
+import os
+import tempfile
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+openpyxl = pytest.importorskip("openpyxl")
+pytest.importorskip("streamlit")
+utils = pytest.importorskip("utils")
+
+
+def test_export_excel_returns_bytes_and_cleans_up(sqlite_env, monkeypatch, tmp_path):
+    backend, store = sqlite_env
+    tmp = tmp_path / "tmp"
+    tmp.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp))
+    part = utils.partition_name(utils.SHEET_RECORDS, "2026-01")
+    row = lambda day, code: [{"날짜": day, "구분": "PC", "품목코드": code, "수량": "1"}.get(c, "") for c in utils.COLS_RECORDS]
+    backend.append([row("2026-01-05", "P1")], part, utils.COLS_RECORDS)
+    backend.append([row("2026-10-01", "P2")], utils.SHEET_RECORDS, utils.COLS_RECORDS)
+    data = utils.export_excel([utils.SHEET_RECORDS], "2026-01-01", "2026-10-31")
+    assert isinstance(data, bytes) and os.listdir(tmp) == []
+    ws = openpyxl.load_workbook(io.BytesIO(data))[utils.EXPORT_SHEETS[utils.SHEET_RECORDS][1]]
+    assert [r[2] for r in ws.iter_rows(min_row=2, values_only=True)] == ["P1", "P2"]
+    assert part not in store.sheets  # 파티션은 캐시에 남기지 않음
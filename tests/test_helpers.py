@@ -0,0 +1,62 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("streamlit")
+utils = pytest.importorskip("utils")
+
+ID = utils.COL_ID
+
+
+def test_runs_splits_consecutive_keys():
+    assert utils._runs([]) == []
+    assert utils._runs([1, 2, 3, 7, 8, 10]) == [[1, 2, 3], [7, 8], [10]]
+
+
+def test_diff_rows_returns_changed_cells_only():
+    orig = pd.DataFrame({ID: ["r1", "r2", "r3"], "수량": [10, 20, 30], "비고": ["", "x", None]})
+    edit = orig.copy()
+    edit.loc[1, "수량"] = 25
+    edit.loc[2, "비고"] = "메모"
+    edit = pd.concat([edit, pd.DataFrame({ID: ["new"], "수량": [1], "비고": [""]})], ignore_index=True)
+    # 원본에 없는 행(새로 추가된 행)과 대상이 아닌 컬럼은 무시
+    assert utils.diff_rows(orig, edit, ["수량", "비고", "없는컬럼"]) == {"r2": {"수량": 25}, "r3": {"비고": "메모"}}
+    assert utils.diff_rows(orig, orig.copy(), ["수량", "비고"]) == {}
+    assert utils.diff_rows(orig, edit.iloc[0:0], ["수량"]) == {}
+
+
+def test_prepare_production_import_validates_rows(sqlite_env):
+    backend, _ = sqlite_env
+    backend.append([["A1", "제품A"], ["B2", "제품B"]], utils.SHEET_ITEMS)
+    raw = pd.DataFrame({
+        "날짜": ["", "2026/10/02", "2026-10-03", "내일", "2026-10-04", ""],
+        "구분": ["", "CM1", "PC", "PC", "없는공정", ""],
+        "품목코드": [" a1 ", "B2", "ZZ", "A1", "A1", ""],
+        "제품명": ["", "직접입력", "", "", "", ""],
+        "수량": ["1,200", "3", "5", "5", "0", ""],
+    })
+    good, err = utils.prepare_production_import(raw, "2026-10-01", "PC")
+    assert good.to_dict("records") == [
+        {"날짜": "2026-10-01", "구분": "PC", "품목코드": "A1", "제품명": "제품A", "수량": 1200},
+        {"날짜": "2026-10-02", "구분": "CM1", "품목코드": "B2", "제품명": "직접입력", "수량": 3},
+    ]
+    # 끝의 빈 행은 오류가 아니라 제외
+    assert err["사유"].tolist() == ["미등록 품목코드", "날짜 형식 오류", "수량 오류"]
+    with pytest.raises(ValueError): utils.prepare_production_import(raw.drop(columns=["수량"]), "2026-10-01", "PC")
+
+
+def test_latest_checks_keeps_last_result_per_item():
+    df = pd.DataFrame([
+        ["2026-10-01", "1", "E1", "온도", "25", "O", "kim", "2026-10-01 09:00:00+09:00", ""],
+        ["2026-10-01", "1", "E1", "온도", "30", "X", "lee", "2026-10-01 08:00:00+09:00", ""],
+        ["2026-10-01", "1", "E1", "온도", "27", "O", "park", "2026-10-01 10:00:00.123456+09:00", "재점검"],
+        ["2026-10-01", "2", "E1", "온도", "20", "O", "kim", "2026-10-01 09:00:00+09:00", ""],
+        ["2026-10-02 00:00:00", "1", "E1", "온도", "22", "O", "kim", "2026-10-02 09:00:00+09:00", ""],
+        ["", "1", "E1", "온도", "99", "X", "kim", "2026-10-03 09:00:00+09:00", ""],
+    ], columns=utils.COLS_CHECK_RESULT)
+    out = utils._latest_checks(df)
+    uid = utils.check_uid("E1", "온도")
+    assert set(out) == {"2026-10-01", "2026-10-02"}
+    assert set(out["2026-10-01"]) == {("1", uid), ("2", uid)}
+    rec = out["2026-10-01"][("1", uid)]
+    assert (rec["value"], rec["checker"], rec["비고"]) == ("27", "park", "재점검")
+    assert utils._latest_checks(df.iloc[0:0]) == {}
@@ -0,0 +1,57 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("streamlit")
+utils = pytest.importorskip("utils")
+
+T = pd.Timestamp
+
+
+def _snap(*rows):
+    return pd.DataFrame(rows, columns=["스냅샷시간", "품목코드", "제품명", "현재고"])
+
+
+def _hist(*rows):
+    return pd.DataFrame(rows, columns=["입력시간", "날짜", "품목코드", "수량"])
+
+
+ITEMS = pd.DataFrame({"품목코드": ["A", "B"], "제품명": ["a", "b"]})
+OPENING = pd.DataFrame({"품목코드": ["A"], "제품명": ["a"], "현재고": [10]})
+
+
+def _stock(df):
+    return dict(zip(df["품목코드"], df["현재고"]))
+
+
+def test_snapshot_plus_later_history():
+    snap = _snap((T("2026-10-01 09:00"), "A", "a", 10))
+    hist = _hist((T("2026-10-01 08:00"), T("2026-10-01"), "A", 99),  # 스냅샷에 이미 반영
+                 (T("2026-10-02 10:00"), T("2026-10-02"), "A", -3),
+                 (T("2026-10-03 10:00"), T("2026-10-03"), "B", 5))
+    assert _stock(utils._compute_stock(snap, hist, ITEMS)) == {"A": 7, "B": 5}
+    assert _stock(utils._compute_stock(snap, hist, ITEMS, until=T("2026-10-03"))) == {"A": 7}
+
+
+def test_as_of_before_first_snapshot_rolls_back():
+    snap = _snap((T("2026-10-05 09:00"), "A", "a", 10))
+    hist = _hist((T("2026-10-03 10:00"), T("2026-10-03"), "A", 4), (T("2026-10-06 10:00"), T("2026-10-06"), "A", 1))
+    assert _stock(utils._compute_stock(snap, hist, ITEMS, until=T("2026-10-03"))) == {"A": 6}
+
+
+def test_no_snapshot_uses_opening_balances():
+    # table 모드 시절 이력은 inventory_data 현재고에 이미 반영되어 있으므로 다시 더하지 않음
+    hist = _hist((T("2026-09-01 10:00"), T("2026-09-01"), "A", 10))
+    assert _stock(utils._compute_stock(_snap(), hist, ITEMS, opening=OPENING)) == {"A": 10}
+    assert _stock(utils._compute_stock(_snap(), hist, ITEMS)) == {"A": 10}
+
+
+def test_switch_to_ledger_keeps_opening_stock(sqlite_env, monkeypatch):
+    backend, store = sqlite_env
+    backend.append([["A", "a", "10", "id1"]], utils.SHEET_INVENTORY)
+    # table 모드에서 남긴 이력 (현재고 10에 이미 반영됨)
+    backend.append([["2026-09-01", "A", "입고", "10", "", "u", "2026-09-01 10:00:00+09:00"]], utils.SHEET_INV_HISTORY)
+    monkeypatch.setattr(utils, "INVENTORY_MODE", "ledger")
+    assert _stock(utils.load_inventory()) == {"A": 10}
+    assert utils.update_inventory("A", "a", -3, "생산출고(테스트)", "u")
+    assert _stock(utils.load_inventory()) == {"A": 7}
+    assert len(backend.read(utils.SHEET_INV_SNAPSHOT)) == 1
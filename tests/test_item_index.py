@@ -0,0 +1,54 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("streamlit")
+utils = pytest.importorskip("utils")
+
+
+def _index(rows):
+    return utils.ItemIndex(pd.DataFrame(rows, columns=["품목코드", "제품명"]))
+
+
+ITEMS = [("P001", "Alpha board"), ("P002", "Beta board"), ("P010", "Main board module"), ("Q100", "Power supply"), (101, "Gamma")]
+
+
+def test_exact_prefix_and_substring_order():
+    idx = _index(ITEMS)
+    assert [c for c, _ in idx.search("p00", limit=2)] == ["P001", "P002"]
+    assert idx.search("p001")[0] == ("P001", "Alpha board")
+    assert [c for c, _ in idx.search("board")] == ["P001", "P002", "P010"]
+    assert idx.search("101")[0] == ("101", "Gamma")  # 숫자로 읽힌 코드(101.0)도 같은 키
+    assert idx.search("") == []
+
+
+def test_fuzzy_matches_single_word_of_a_name():
+    assert [c for c, _ in _index(ITEMS).search("alpah")] == ["P001"]
+
+
+def test_fuzzy_prefers_items_matching_every_query_word():
+    hits = [c for c, _ in _index(ITEMS).search("boadr modle")]
+    assert hits[0] == "P010" and set(hits) == {"P001", "P002", "P010"}
+
+
+def test_fuzzy_code_typo_and_no_match():
+    idx = _index(ITEMS)
+    assert idx.search("Q10O")[0][0] == "Q100"
+    assert idx.search("zzzz qqq") == []
+
+
+def test_common_trigrams_are_pruned():
+    n = utils.ItemIndex.FUZZY_MAX_POSTINGS * 3
+    idx = _index([(f"P{i:05d}-X", f"board {i}") for i in range(n)] + [("Z1", "Alpha board")])
+    assert all(len(ids) <= utils.ItemIndex.FUZZY_MAX_POSTINGS for ids in idx._grams.values())
+    assert "-x " not in idx._grams  # 모든 코드에 있는 3-gram
+    assert idx.search("alpah") == [("Z1", "Alpha board")]
+    assert idx.search("P00012-Y")[0][0] == "P00012-X"
+
+
+def test_item_index_follows_sheet_edits(sqlite_env):
+    backend, store = sqlite_env
+    backend.append([["P001", "Alpha board"]], utils.SHEET_ITEMS)
+    assert utils.get_item_index().search("NEW") == []
+    backend.append([["NEW1", "New item"]], utils.SHEET_ITEMS)  # 시트에서 직접 추가
+    store.sheets[utils.SHEET_ITEMS]["checked"] = 0
+    assert utils.get_item_index().search("NEW") == [("NEW1", "New item")]
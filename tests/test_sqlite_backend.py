@@ -0,0 +1,73 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("streamlit")
+utils = pytest.importorskip("utils")
+
+
+class FakeMirror:
+    """SheetsBackend 대신 쓰는 미러: 호출을 기록하고, fail에 든 메서드는 실패"""
+    def __init__(self, frames=None):
+        self.frames, self.calls, self.fail = frames or {}, [], set()
+
+    def _call(self, method, *args):
+        self.calls.append((method,) + args)
+        if method in self.fail: raise ConnectionError(method)
+        return True
+
+    def append(self, rows, sheet_name, cols=None): return self._call("append", sheet_name, rows)
+    def update_cells(self, sheet_name, cells): return self._call("update_cells", sheet_name, cells)
+    def delete_rows(self, sheet_name, keys): return self._call("delete_rows", sheet_name, keys)
+    def add_column(self, sheet_name, col): return self._call("add_column", sheet_name, col)
+    def write(self, df, sheet_name): return self._call("write", sheet_name, len(df))
+
+    def list_sheets(self): return list(self.frames)
+
+    def read(self, sheet_name, cols=None):
+        df = self.frames.get(sheet_name)
+        if isinstance(df, Exception): raise df
+        return df
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return utils.SQLiteBackend(str(tmp_path / "t.db"), mirror=FakeMirror())
+
+
+def test_failed_mirror_append_forces_full_push(backend):
+    m = backend.mirror
+    backend.append([["A", "a"]], utils.SHEET_ITEMS)
+    m.fail = {"append", "write"}
+    backend.append([["B", "b"]], utils.SHEET_ITEMS)
+    assert utils.SHEET_ITEMS in backend.dirty
+    m.fail, m.calls = set(), []
+    # 행 위치를 믿을 수 없으므로 셀 수정 대신 시트 전체를 다시 씀
+    backend.update_cells(utils.SHEET_ITEMS, [(1, "제품명", "x")])
+    assert [c[0] for c in m.calls] == ["write"]
+    assert utils.SHEET_ITEMS not in backend.dirty
+    backend.update_cells(utils.SHEET_ITEMS, [(2, "제품명", "y")])
+    assert m.calls[-1] == ("update_cells", utils.SHEET_ITEMS, [(1, "제품명", "y")])
+
+
+def test_dirty_flag_survives_restart(tmp_path):
+    path = str(tmp_path / "t.db")
+    b = utils.SQLiteBackend(path, mirror=FakeMirror())
+    b.mirror.fail = {"append", "write"}
+    b.append([["A", "a"]], utils.SHEET_ITEMS)
+    assert utils.SHEET_ITEMS in utils.SQLiteBackend(path, mirror=FakeMirror()).dirty
+
+
+def test_import_retries_after_partial_failure(tmp_path):
+    part = utils.partition_name(utils.SHEET_RECORDS, "2026-01")
+    items = pd.DataFrame({"품목코드": ["A", None, "B"], "제품명": ["a", None, "b"]})
+    src = FakeMirror({utils.SHEET_ITEMS: items, part: ConnectionError("429")})
+    b = utils.SQLiteBackend(str(tmp_path / "t.db"), mirror=src)
+    with pytest.raises(ConnectionError): b.import_from(src)
+    assert not b.meta("imported") and b.meta(f"imported:{utils.SHEET_ITEMS}")
+    # 빈 행을 버렸으므로 미러와 위치가 어긋남 → 전체 재전송 대상
+    assert utils.SHEET_ITEMS in b.dirty
+    src.frames[part] = pd.DataFrame({"날짜": ["2026-01-05"]})
+    src.frames[utils.SHEET_ITEMS] = ConnectionError("이미 가져온 시트는 다시 읽지 않음")
+    b.import_from(src)
+    assert b.meta("imported")
+    assert len(b.read(part)) == 1 and len(b.read(utils.SHEET_ITEMS)) == 2
@@ -0,0 +1,118 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("streamlit")
+utils = pytest.importorskip("utils")
+
+
+def _store(df):
+    store = utils.SheetStore()
+    store.sheets["t"] = {"df": df, "marker": len(df), "synced": 0, "checked": 0, "stale": False}
+    return store
+
+
+def test_patch_cells_writes_into_str_column():
+    # SQLite는 모든 컬럼을 문자열로 읽음 → 숫자 값 수정이 TypeError 없이 반영되어야 함
+    df = pd.DataFrame({"수량": pd.Series(["1", "2"], dtype="str", index=[1, 2]), "제품명": ["a", "b"]}, index=[1, 2])
+    store = _store(df)
+    store.patch_cells("t", [(2, "수량", 99)])
+    out = store.sheets["t"]["df"]
+    assert out.at[2, "수량"] == 99
+    assert out.at[1, "수량"] == "1"
+    assert not store.sheets["t"]["stale"]
+
+
+def test_patch_cells_stores_serialized_value():
+    df = pd.DataFrame({"날짜": ["2026-10-01"]}, index=[0])
+    store = _store(df)
+    store.patch_cells("t", [(0, "날짜", pd.Timestamp("2026-10-18"))])
+    assert store.sheets["t"]["df"].at[0, "날짜"] == "2026-10-18"
+
+
+def test_patch_cells_unknown_key_marks_stale():
+    store = _store(pd.DataFrame({"수량": ["1"]}, index=[0]))
+    store.patch_cells("t", [(5, "수량", 1)])
+    assert store.sheets["t"]["stale"]
+
+
+def _insert(backend, sheet_name, *rows):
+    # utils를 거치지 않은 변경 (시트 직접 수정, 다른 인스턴스)
+    with backend.lock:
+        for r in rows: backend.conn.execute(f"INSERT INTO {utils._q(sheet_name)} VALUES ({', '.join('?' * len(r))})", r)
+        backend.conn.commit()
+
+
+def test_remote_change_bumps_version(sqlite_env):
+    backend, store = sqlite_env
+    _insert(backend, utils.SHEET_ITEMS, ("A", "a"))
+    store.get(utils.SHEET_ITEMS, utils.COLS_ITEMS)
+    v = utils.data_version(utils.SHEET_ITEMS)
+    store.sheets[utils.SHEET_ITEMS]["checked"] = 0  # 대조 주기 경과, 원격 변경 없음
+    store.get(utils.SHEET_ITEMS, utils.COLS_ITEMS)
+    assert utils.data_version(utils.SHEET_ITEMS) == v
+    _insert(backend, utils.SHEET_ITEMS, ("NEW", "new"))
+    store.sheets[utils.SHEET_ITEMS]["checked"] = 0
+    assert "NEW" in set(store.get(utils.SHEET_ITEMS, utils.COLS_ITEMS)["품목코드"])
+    assert utils.data_version(utils.SHEET_ITEMS) > v
+
+
+def test_inventory_update_uses_remote_balance(sqlite_env):
+    backend, store = sqlite_env
+    _insert(backend, utils.SHEET_INVENTORY, ("A", "a", "10", "id1"))
+    store.get(utils.SHEET_INVENTORY, utils.COLS_INVENTORY)
+    with backend.lock:  # 행 수는 그대로, 시트에서 현재고만 직접 수정
+        backend.conn.execute(f"UPDATE {utils._q(utils.SHEET_INVENTORY)} SET 현재고 = '15'")
+        backend.conn.commit()
+    with store.lock: assert utils._update_inventory_rows(store, [("A", "a", 1)])
+    assert backend.read(utils.SHEET_INVENTORY)["현재고"].tolist() == [16]
+
+
+def test_load_data_does_not_backfill_ids(sqlite_env):
+    backend, store = sqlite_env
+    _insert(backend, utils.SHEET_INVENTORY, ("A", "a", "1", ""))
+    assert utils.load_data(utils.SHEET_INVENTORY, utils.COLS_INVENTORY)[utils.COL_ID].tolist() == [""]
+    assert backend.read(utils.SHEET_INVENTORY)[utils.COL_ID].tolist() == [""]
+    utils.ensure_row_ids(utils.SHEET_INVENTORY)
+    ids = utils.load_data(utils.SHEET_INVENTORY, utils.COLS_INVENTORY)[utils.COL_ID].tolist()
+    assert ids[0] and ids == backend.read(utils.SHEET_INVENTORY)[utils.COL_ID].tolist()
+
+
+def test_snapshot_round_trip_matches_fresh_read(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(utils, "SNAPSHOT_DIR", str(tmp_path))
+    header = ["id", "name", "qty"]
+    fresh = lambda rows: utils._clean_frame(utils._values_to_frame(header, rows), header)
+    store = _store(fresh([[101, "a", 5], ["X-2", "b", ""]]))
+    store.patch_append("t", header, [["103", "c", "7"]], [2])  # utils로 추가한 행은 문자열
+    ent = store.sheets["t"]
+    utils._write_snapshot("t", utils._snapshot_frame(ent["df"]), {"smt_marker": "3"})
+    loaded = store._load_snapshot("t", header)["df"]
+    remote = fresh([[101, "a", 5], ["X-2", "b", ""], [103, "c", 7]])
+    for col in header:
+        assert loaded[col].map(utils._key_str).tolist() == remote[col].map(utils._key_str).tolist()
+    assert loaded["id"].tolist() == ["101", "X-2", "103"]
+
+
+def test_derived_cache_sees_remote_change(sqlite_env):
+    backend, store = sqlite_env
+    _insert(backend, utils.SHEET_EQUIPMENT, ("E1", "old", "f"))
+    assert dict(utils.get_equipment_map()) == {"E1": "old"}
+    _insert(backend, utils.SHEET_EQUIPMENT, ("E2", "new", "f"))
+    assert dict(utils.get_equipment_map()) == {"E1": "old"}  # 대조 주기 전에는 캐시 그대로
+    store.sheets[utils.SHEET_EQUIPMENT]["checked"] = 0
+    assert dict(utils.get_equipment_map()) == {"E1": "old", "E2": "new"}
+
+
+def test_master_sheet_edit_reaches_equipment_map_and_check_spec(sqlite_env):
+    backend, store = sqlite_env
+    _insert(backend, utils.SHEET_EQUIPMENT, ("E1", "old", "f"))
+    _insert(backend, utils.SHEET_CHECK_MASTER, ("L1", "E1", "old", "온도", "", "", "OX", "", "", ""))
+    assert dict(utils.get_equipment_map()) == {"E1": "old"}
+    assert utils.check_lines() == ("L1",)
+    with backend.lock:  # 행 수는 그대로 두고 시트에서 이름만 수정
+        backend.conn.execute(f"UPDATE {utils._q(utils.SHEET_EQUIPMENT)} SET name = 'new'")
+        backend.conn.execute(f"UPDATE {utils._q(utils.SHEET_CHECK_MASTER)} SET line = 'L2'")
+        backend.conn.commit()
+    for s in (utils.SHEET_EQUIPMENT, utils.SHEET_CHECK_MASTER): store.sheets[s]["checked"] = 0
+    assert dict(utils.get_equipment_map()) == {"E1": "new"}
+    assert utils.check_lines() == ("L2",)
@@ -1,18 +1,38 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta, timezone
 import time
 import hashlib
+import functools
+import bisect
+import difflib
+import heapq
+import operator
+import atexit
+import random
+import uuid
 import os
+import re
+import io
 import tempfile
+import zipfile
+import sqlite3
+import threading
+import logging
 import urllib.request
+from types import MappingProxyType
 from fpdf import FPDF
+from openpyxl import Workbook
 import streamlit.components.v1 as components
 
 # 구글 시트 및 데이터 라이브러리
 import gspread
 from google.oauth2.service_account import Credentials
 from gspread_dataframe import set_with_dataframe, get_as_dataframe
+from pandas.io.parsers import TextParser
+
+logger = logging.getLogger("smt")
 
 # 시각화 라이브러리 (안전 장치)
 try:
@@ -21,6 +41,17 @@ try:
 except Exception:
     HAS_ALTAIR = False
 
+# 로컬 스냅샷 저장 형식 (streamlit 설치 시 함께 설치됨)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_ARROW = True
+except Exception:
+    HAS_ARROW = False
+
+# 부분 재실행(fragment): 위젯 변경 시 해당 블록만 다시 실행 (지원하지 않는 버전에서는 일반 함수로 동작)
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda f: f)
+
 # ==========================================
 # 1. 상수 및 설정 정의
 # ==========================================
@@ -29,20 +60,35 @@ SHEET_RECORDS = "production_data"
 SHEET_ITEMS = "item_codes"
 SHEET_INVENTORY = "inventory_data"
 SHEET_INV_HISTORY = "inventory_history"
+SHEET_INV_SNAPSHOT = "inventory_snapshot"
 SHEET_MAINTENANCE = "maintenance_data"
 SHEET_EQUIPMENT = "equipment_list"
 SHEET_CHECK_MASTER = "daily_check_master"
 SHEET_CHECK_RESULT = "daily_check_result"
 
-COLS_RECORDS = ["날짜", "구분", "품목코드", "제품명", "수량", "입력시간", "작성자", "수정자", "수정시간"]
+COL_ID = "레코드ID"  # 행 고유 ID (수정/삭제 시 행 위치 대신 사용)
+COLS_RECORDS = ["날짜", "구분", "품목코드", "제품명", "수량", "입력시간", "작성자", "수정자", "수정시간", COL_ID]
 COLS_ITEMS = ["품목코드", "제품명"]
-COLS_INVENTORY = ["품목코드", "제품명", "현재고"]
+COLS_INVENTORY = ["품목코드", "제품명", "현재고", COL_ID]
 COLS_INV_HISTORY = ["날짜", "품목코드", "구분", "수량", "비고", "작성자", "입력시간"]
-COLS_MAINTENANCE = ["날짜", "설비ID", "설비명", "작업구분", "작업내용", "교체부품", "비용", "작업자", "비가동시간", "입력시간", "작성자", "수정자", "수정시간"]
+COLS_INV_SNAPSHOT = ["스냅샷시간", "품목코드", "제품명", "현재고"]
+COLS_MAINTENANCE = ["날짜", "설비ID", "설비명", "작업구분", "작업내용", "교체부품", "비용", "작업자", "비가동시간", "입력시간", "작성자", "수정자", "수정시간", COL_ID]
 COLS_EQUIPMENT = ["id", "name", "func"]
 COLS_CHECK_MASTER = ["line", "equip_id", "equip_name", "item_name", "check_content", "standard", "check_type", "min_val", "max_val", "unit"]
 COLS_CHECK_RESULT = ["date", "line", "equip_id", "item_name", "value", "ox", "checker", "timestamp", "비고"]
 
+PROD_CATS = ["PC", "CM1", "CM3", "배전", "샘플", "후공정", "후공정 외주"]  # 생산 공정 구분
+OUT_CATS = ["후공정", "후공정 외주"]  # 재고 차감(출고) 공정, 배전은 재고 반영 없음
+
+# 컬럼 타입 스키마 (load_data에서 한 번만 변환, 스키마에 없는 컬럼은 문자열 그대로)
+# date: 날짜(datetime64, 시간 제거) / datetime: KST naive 시각 / int: int32 / cat: category
+SCHEMA_RECORDS = {"날짜": "date", "구분": "cat", "수량": "int"}
+SCHEMA_INVENTORY = {"현재고": "int"}
+SCHEMA_INV_HISTORY = {"날짜": "date", "구분": "cat", "수량": "int", "입력시간": "datetime"}
+SCHEMA_INV_SNAPSHOT = {"스냅샷시간": "datetime", "현재고": "int"}
+SCHEMA_MAINTENANCE = {"날짜": "date", "작업구분": "cat", "비용": "int", "비가동시간": "int"}
+SCHEMA_CHECK_RESULT = {"date": "date", "line": "cat", "ox": "cat", "timestamp": "datetime"}
+
 def make_hash(password): return hashlib.sha256(str.encode(password)).hexdigest()
 USERS = {
     "cimon": {"name": "관리자", "password_hash": make_hash("7801083"), "role": "admin"},
@@ -221,8 +267,76 @@ def render_header():
     # 위 코드는 레이아웃을 잡고, 아래 margin을 줍니다.
 
 # ==========================================
-# 4. 데이터 핸들링 (Google Sheets)
+# 4. 데이터 핸들링 (Storage Backend)
 # ==========================================
+# 시트 이름 -> 컬럼 정의 (모든 저장소가 같은 테이블 구성을 사용)
+SHEET_COLS = {
+    SHEET_RECORDS: COLS_RECORDS, SHEET_ITEMS: COLS_ITEMS, SHEET_INVENTORY: COLS_INVENTORY,
+    SHEET_INV_HISTORY: COLS_INV_HISTORY, SHEET_MAINTENANCE: COLS_MAINTENANCE, SHEET_EQUIPMENT: COLS_EQUIPMENT,
+    SHEET_CHECK_MASTER: COLS_CHECK_MASTER, SHEET_CHECK_RESULT: COLS_CHECK_RESULT,
+    SHEET_INV_SNAPSHOT: COLS_INV_SNAPSHOT,
+}
+# 시트 이름 -> 컬럼 타입 스키마
+SHEET_SCHEMAS = {
+    SHEET_RECORDS: SCHEMA_RECORDS, SHEET_INVENTORY: SCHEMA_INVENTORY, SHEET_INV_HISTORY: SCHEMA_INV_HISTORY,
+    SHEET_INV_SNAPSHOT: SCHEMA_INV_SNAPSHOT, SHEET_MAINTENANCE: SCHEMA_MAINTENANCE, SHEET_CHECK_RESULT: SCHEMA_CHECK_RESULT,
+}
+# SQLite 인덱스 (조회 조건으로 쓰이는 컬럼)
+SHEET_INDEXES = {
+    SHEET_RECORDS: [["날짜"], ["품목코드"], ["입력시간"], [COL_ID]],
+    SHEET_ITEMS: [["품목코드"]],
+    SHEET_INVENTORY: [["품목코드"], [COL_ID]],
+    SHEET_INV_HISTORY: [["날짜"], ["품목코드"]],
+    SHEET_INV_SNAPSHOT: [["스냅샷시간"]],
+    SHEET_MAINTENANCE: [["날짜"], ["입력시간"], [COL_ID]],
+    SHEET_EQUIPMENT: [["id"]],
+    SHEET_CHECK_MASTER: [["line"]],
+    SHEET_CHECK_RESULT: [["date", "line"], ["timestamp"]],
+}
+
+# 레코드ID를 부여/관리하는 시트 (ID -> 행 색인으로 수정/삭제)
+ID_SHEETS = {SHEET_RECORDS, SHEET_INVENTORY, SHEET_MAINTENANCE}
+
+# 저장소 선택: "sheets"(기본, Google Sheets) | "sqlite"(로컬 DB, SMT_SQLITE_MIRROR=1 이면 시트에도 미러링)
+STORAGE_BACKEND = os.environ.get("SMT_STORAGE", "sheets")
+SQLITE_PATH = os.environ.get("SMT_SQLITE_PATH", "smt_data.db")
+SQLITE_MIRROR = os.environ.get("SMT_SQLITE_MIRROR", "0") == "1"
+
+# 추가(append)만 발생하는 시트 → 마지막으로 읽은 행 이후만 내려받는 증분(tail) 동기화 대상
+APPEND_ONLY_SHEETS = {SHEET_RECORDS, SHEET_CHECK_RESULT, SHEET_INV_HISTORY, SHEET_INV_SNAPSHOT}
+CACHE_TTL = 60           # 캐시된 시트를 원격과 대조하는 주기 (초)
+FULL_RESYNC_SEC = 1800   # 시트에서 직접 수정/삭제한 경우를 대비해 주기적으로 전체 동기화
+# 기준정보 시트: 작고 시트에서 직접 고치는 일이 많음 → 대조 때 행 수 대신 전체를 다시 읽음 (요청 수는 같고, 이름 수정도 CACHE_TTL 안에 반영)
+REFETCH_SHEETS = {SHEET_ITEMS, SHEET_EQUIPMENT, SHEET_CHECK_MASTER}
+
+# 로컬 스냅샷: 시트별 원본 프레임을 Parquet으로 보관 → 재시작 직후 원격을 기다리지 않고 바로 사용하고, 원격 대조는 백그라운드에서
+SNAPSHOT_ENABLED = os.environ.get("SMT_SNAPSHOT", "1") == "1"
+SNAPSHOT_DIR = os.environ.get("SMT_SNAPSHOT_DIR", ".smt_cache")
+SNAPSHOT_SAVE_SEC = 300  # 변경된 시트의 스냅샷을 다시 저장하는 최소 간격 (종료 시에는 항상 저장)
+
+# 쓰기 지연(write-behind): 추가 행을 시트별로 모아 한 번의 append_rows로 전송 (Google Sheets 저장소에서만 사용)
+WRITE_BEHIND = os.environ.get("SMT_WRITE_BEHIND", "1") == "1"
+WRITE_FLUSH_SEC = 2.0     # 최대 대기 시간
+WRITE_FLUSH_SIZE = 50     # 시트별 버퍼가 이 행 수에 도달하면 즉시 전송
+WRITE_RETRY_MAX_SEC = 60  # 429/5xx 재시도 간격 상한 (지수 백오프)
+WRITE_RETRY_MAX_ATTEMPTS = 5  # 재시도 횟수 상한 (전송 중에는 flush_writes 호출이 대기하므로 무한 재시도하지 않음)
+
+# 월별 보관(아카이브): 지난 달 행을 "<시트명>__YYYY-MM" 파티션 시트(테이블)로 옮겨 hot 시트를 작게 유지
+ARCHIVE_SHEETS = {SHEET_RECORDS: "날짜", SHEET_CHECK_RESULT: "date"}  # 대상 시트 -> 날짜 컬럼
+ARCHIVE_KEEP_MONTHS = 1  # 이번 달 외에 hot 시트에 남겨둘 지난 달 수 (주간 추이/전주 비교 등 최근 조회용)
+PARTITION_SEP = "__"
+
+# 엑셀 내보내기: 대상 시트 -> (날짜 컬럼, 워크시트 이름)
+EXPORT_SHEETS = {
+    SHEET_RECORDS: ("날짜", "생산실적"), SHEET_MAINTENANCE: ("날짜", "설비보전"),
+    SHEET_CHECK_RESULT: ("date", "일일점검"), SHEET_INV_HISTORY: ("날짜", "재고이력"),
+}
+EXPORT_CHUNK = 5000                   # 한 번에 변환해서 쓰는 행 수
+
+# 재고 방식: "table"(inventory_data 시트의 현재고를 직접 수정) | "ledger"(스냅샷 + inventory_history 증감 누적으로 계산)
+INVENTORY_MODE = os.environ.get("SMT_INVENTORY_MODE", "table")
+INV_SNAPSHOT_SEC = 24 * 3600  # ledger 모드: 마지막 스냅샷이 이보다 오래되면 재고 저장 시 새 스냅샷 기록
+
 @st.cache_resource
 def get_gs_connection():
     try:
@@ -233,146 +347,1749 @@ def get_gs_connection():
         return gspread.authorize(credentials)
     except: return None
 
+@st.cache_resource
+def _gs_handles():
+    # 프로세스 전체 공유: Spreadsheet/Worksheet 핸들과 시트별 헤더 (WorksheetNotFound, 헤더 불일치, API 오류 시에만 갱신)
+    return {"lock": threading.RLock(), "sh": None, "ws": {}, "headers": {}}
+
+def get_spreadsheet(refresh=False):
+    h = _gs_handles()
+    with h["lock"]:
+        if h["sh"] is None or refresh:
+            client = get_gs_connection()
+            if not client: return None
+            try: h["sh"] = client.open(GOOGLE_SHEET_NAME)
+            except: return None
+            h["ws"].clear()
+            h["headers"].clear()
+        return h["sh"]
+
 def get_worksheet(sheet_name, create_cols=None):
-    client = get_gs_connection()
-    if not client: return None
-    try:
-        sh = client.open(GOOGLE_SHEET_NAME)
-    except: return None
-    try:
-        return sh.worksheet(sheet_name)
-    except gspread.WorksheetNotFound:
-        if create_cols:
+    h = _gs_handles()
+    ws = h["ws"].get(sheet_name)
+    if ws: return ws
+    with h["lock"]:
+        sh = get_spreadsheet()
+        if not sh: return None
+        try:
+            ws = sh.worksheet(sheet_name)
+        except gspread.WorksheetNotFound:
+            if not create_cols: return None
             ws = sh.add_worksheet(title=sheet_name, rows=100, cols=20)
             ws.append_row(create_cols)
-            return ws
-        return None
+            h["headers"][sheet_name] = list(create_cols)
+        except: return None
+        h["ws"][sheet_name] = ws
+        return ws
+
+def forget_worksheet(sheet_name=None):
+    """캐시된 핸들/헤더 폐기 (시트가 삭제·변경되어 API 오류가 난 경우)"""
+    h = _gs_handles()
+    with h["lock"]:
+        if sheet_name:
+            h["ws"].pop(sheet_name, None)
+            h["headers"].pop(sheet_name, None)
+        else:
+            h["ws"].clear()
+            h["headers"].clear()
+
+# 값 읽기 옵션: get_as_dataframe(evaluate_formulas=True)와 동일 (수식 결과의 원래 값, 날짜는 표시 문자열)
+SHEETS_RENDER = {"valueRenderOption": "UNFORMATTED_VALUE", "dateTimeRenderOption": "FORMATTED_STRING"}
+
+class SheetsBackend:
+    """Google Sheets 저장소 (시트 1개 = 테이블 1개). 행 key = 데이터 행 순번(0부터, 시트 행 번호 - 2)"""
+    name = "sheets"
+    first_key = 0
+    shifts_on_delete = True  # 행 삭제 시 아래 행들의 key가 당겨짐
+
+    def _ws(self, sheet_name, cols=None):
+        return get_worksheet(sheet_name, create_cols=cols)
+
+    def _guard(self, sheet_name, fn):
+        try: return fn()
+        except gspread.exceptions.APIError as e:
+            if not _is_retryable(e): forget_worksheet(sheet_name)
+            raise
+
+    def read(self, sheet_name, cols=None):
+        ws = self._ws(sheet_name, cols)
+        if not ws: return None
+        _gs_handles()["headers"].pop(sheet_name, None)  # 전체 읽기 때마다 헤더도 새로 확인
+        return self._guard(sheet_name, lambda: get_as_dataframe(ws, evaluate_formulas=True))
+
+    def header(self, sheet_name, cols=None, refresh=False):
+        headers = _gs_handles()["headers"]
+        if not refresh and headers.get(sheet_name): return headers[sheet_name]
+        ws = self._ws(sheet_name, cols)
+        if not ws: return None
+        try: headers[sheet_name] = self._guard(sheet_name, lambda: ws.row_values(1))
+        except: return list(cols) if cols else None
+        return headers[sheet_name]
+
+    def row_marker(self, sheet_name):
+        """현재 원격 데이터 행 수 (첫 컬럼 기준)"""
+        ws = self._ws(sheet_name)
+        if not ws: return None
+        return max(len(self._guard(sheet_name, lambda: ws.col_values(1))) - 1, 0)
+
+    def list_sheets(self):
+        sh = get_spreadsheet()
+        return [ws.title for ws in sh.worksheets()] if sh else []
+
+    def read_many(self, sheet_names, cols=None):
+        """여러 시트를 values_batch_get 1회로 읽음 → {시트명: (DataFrame, marker)}"""
+        cols, h = cols or {}, _gs_handles()
+        sh = get_spreadsheet()
+        if not sh: return {}
+        if any(n not in h["ws"] for n in sheet_names):
+            with h["lock"]:
+                for ws in sh.worksheets(): h["ws"].setdefault(ws.title, ws)  # 핸들을 한 번에 확보
+        names = [n for n in sheet_names if self._ws(n, cols.get(n))]
+        if not names: return {}
+        resp = sh.values_batch_get(["'" + n.replace("'", "''") + "'" for n in names], params=SHEETS_RENDER)
+        out = {}
+        for n, vr in zip(names, resp.get("valueRanges", [])):
+            values = vr.get("values", [])
+            if not values:
+                out[n] = (pd.DataFrame(), 0)
+                continue
+            h["headers"][n] = list(values[0])
+            out[n] = (_values_to_frame(values[0], values[1:]), len(values) - 1)
+        return out
+
+    def read_tail(self, sheet_name, marker=0, cols=None):
+        """marker(이미 읽은 데이터 행 수) 이후의 행만 읽음 → (DataFrame, 새 marker)"""
+        if marker == 0:
+            df = self.read(sheet_name, cols)
+            # get_as_dataframe는 빈 행을 버리고 위치 index는 유지 → marker는 마지막 데이터 행 다음 key
+            return df, (int(df.index.max()) + 1 if df is not None and len(df) else 0)
+        ws = self._ws(sheet_name, cols)
+        header = self.header(sheet_name, cols)
+        if not ws or not header: return None, marker
+        values = list(self._guard(sheet_name, lambda: ws.get(f"A{marker + 2}:{_col_letter(len(header))}",
+                                                              value_render_option=SHEETS_RENDER["valueRenderOption"],
+                                                              date_time_render_option=SHEETS_RENDER["dateTimeRenderOption"])))
+        return _values_to_frame(header, values, marker), marker + len(values)
+
+    def write(self, df, sheet_name):
+        ws = self._ws(sheet_name)
+        if not ws: return False
+        def _write():
+            ws.clear()
+            set_with_dataframe(ws, df)
+        self._guard(sheet_name, _write)
+        _gs_handles()["headers"][sheet_name] = [str(c) for c in df.columns]
+        return True
+
+    def _col_index(self, sheet_name, col):
+        header = self.header(sheet_name) or []
+        if col not in header: header = self.header(sheet_name, refresh=True) or []
+        return header.index(col) + 1
+
+    def update_cells(self, sheet_name, cells):
+        """(행 key, 컬럼명, 값) 목록을 batch_update 1회로 수정 (같은 컬럼의 연속 행은 하나의 범위로 묶음)"""
+        ws = self._ws(sheet_name)
+        if not ws: return False
+        by_col = {}
+        for key, col, v in cells: by_col.setdefault(col, {})[key] = _cell_value(v)
+        data = []
+        for col, vals in by_col.items():
+            c = self._col_index(sheet_name, col)
+            for run in _runs(sorted(vals)):
+                a1 = gspread.utils.rowcol_to_a1(run[0] + 2, c) + ":" + gspread.utils.rowcol_to_a1(run[-1] + 2, c)
+                data.append({"range": a1, "values": [[vals[k]] for k in run]})
+        self._guard(sheet_name, lambda: ws.batch_update(data))
+        return True
+
+    def delete_rows(self, sheet_name, keys):
+        """행 삭제: 연속 구간별 deleteDimension 요청을 아래쪽부터 모아 1회 전송"""
+        ws = self._ws(sheet_name)
+        if not ws: return False
+        reqs = [{"deleteDimension": {"range": {"sheetId": ws.id, "dimension": "ROWS", "startIndex": run[0] + 1, "endIndex": run[-1] + 2}}}
+                for run in reversed(_runs(sorted(set(keys))))]
+        self._guard(sheet_name, lambda: ws.spreadsheet.batch_update({"requests": reqs}))
+        return True
+
+    def add_column(self, sheet_name, col):
+        ws = self._ws(sheet_name)
+        header = self.header(sheet_name, refresh=True)
+        if not ws or header is None: return False
+        if col in header: return True
+        n = len(header) + 1
+        if ws.col_count < n: self._guard(sheet_name, lambda: ws.add_cols(n - ws.col_count))
+        self._guard(sheet_name, lambda: ws.update_cell(1, n, col))
+        _gs_handles()["headers"][sheet_name] = header + [col]
+        return True
+
+    def append(self, rows, sheet_name, cols=None):
+        """추가된 행의 key 목록 반환 (응답에서 위치를 알 수 없으면 True)"""
+        ws = self._ws(sheet_name, cols)
+        if not ws: return False
+        resp = self._guard(sheet_name, lambda: ws.append_rows(rows))
+        try:
+            start = int(re.search(r"![A-Z]+(\d+)", resp["updates"]["updatedRange"]).group(1)) - 2
+            return list(range(start, start + len(rows)))
+        except: return True
+
+def _is_retryable(e):
+    """쿼터 초과(429)/서버 오류(5xx)/네트워크 오류 → 재시도 대상"""
+    if isinstance(e, gspread.exceptions.APIError):
+        code = getattr(getattr(e, "response", None), "status_code", None)
+        return code == 429 or (code is not None and code >= 500)
+    return isinstance(e, (ConnectionError, TimeoutError, OSError))
+
+def _runs(keys):
+    """정렬된 정수 목록을 연속 구간으로 분리: [1,2,3,7,8] -> [[1,2,3],[7,8]]"""
+    runs = []
+    for k in keys:
+        if runs and runs[-1][-1] == k - 1: runs[-1].append(k)
+        else: runs.append([k])
+    return runs
+
+def _col_letter(n):
+    return re.sub(r"\d", "", gspread.utils.rowcol_to_a1(1, n))
+
+def _values_to_frame(header, rows, start=0):
+    """시트 값(list of list)을 get_as_dataframe과 같은 규칙으로 DataFrame 변환 (index = 데이터 행 번호, 빈 행은 제외)"""
+    if not rows: return pd.DataFrame(columns=header)
+    width = len(header)
+    rows = [(list(r) + [""] * width)[:width] for r in rows]
+    df = TextParser([list(header)] + rows, header=0, skip_blank_lines=False).read()
+    df.index = range(start, start + len(df))
+    return df.dropna(how='all')
+
+def _base_sheet(sheet_name):
+    """파티션 시트명("production_data__2024-01") -> 원본 시트명"""
+    return sheet_name.split(PARTITION_SEP)[0]
+
+def _q(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _cell_value(v):
+    """numpy/pandas 값을 저장소에 쓸 수 있는 기본 타입으로 변환 (시간 없는 날짜는 YYYY-MM-DD)"""
+    if v is None or v is pd.NaT: return ""
+    if isinstance(v, np.datetime64): v = pd.Timestamp(v)
+    if isinstance(v, pd.Timestamp):
+        if pd.isna(v): return ""
+        return v.strftime("%Y-%m-%d") if v.tz is None and v == v.normalize() else str(v)
+    if hasattr(v, "item"): v = v.item()  # numpy 스칼라
+    if isinstance(v, float) and np.isnan(v): return ""
+    if isinstance(v, (int, float, str)): return v
+    return str(v)
+
+def _serialize_frame(df):
+    """타입이 적용된 프레임을 저장용 기본 타입 프레임으로 변환"""
+    if df.empty: return df.fillna("")
+    return df.astype(object).apply(lambda s: s.map(_cell_value))
+
+class SQLiteBackend:
+    """로컬 SQLite 저장소 (시트별 테이블 + 인덱스). mirror가 있으면 쓰기를 그대로 전달. 행 key = rowid"""
+    name = "sqlite"
+    first_key = 1
+    shifts_on_delete = False
+    META = "_smt_meta"  # 내부 상태 (가져오기 완료 표시, 미러 전체 재전송 필요 시트)
+
+    def __init__(self, path, mirror=None):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.mirror = mirror
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            for sheet_name, cols in SHEET_COLS.items(): self._ensure_table(sheet_name, cols)
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self.META} (key TEXT PRIMARY KEY, value TEXT)")
+            self.conn.commit()
+            self.dirty = {r[0].split(":", 1)[1] for r in self.conn.execute(f"SELECT key FROM {self.META} WHERE key LIKE 'mirror_dirty:%'")}
+
+    def _columns(self, sheet_name):
+        return [r[1] for r in self.conn.execute(f"PRAGMA table_info({_q(sheet_name)})")]
+
+    def _ensure_table(self, sheet_name, cols):
+        if not self._columns(sheet_name):
+            self.conn.execute(f"CREATE TABLE {_q(sheet_name)} ({', '.join(_q(c) for c in cols)})")
+        existing = set(self._columns(sheet_name))
+        for idx_cols in SHEET_INDEXES.get(_base_sheet(sheet_name), []):
+            if not set(idx_cols) <= existing: continue
+            idx_name = _q(f"idx_{sheet_name}_{'_'.join(idx_cols)}")
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {idx_name} ON {_q(sheet_name)} ({', '.join(_q(c) for c in idx_cols)})")
+        self.conn.commit()
+
+    def meta(self, key):
+        with self.lock:
+            row = self.conn.execute(f"SELECT value FROM {self.META} WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+
+    def set_meta(self, key, value):
+        """value가 None이면 삭제"""
+        with self.lock:
+            if value is None: self.conn.execute(f"DELETE FROM {self.META} WHERE key = ?", (key,))
+            else: self.conn.execute(f"INSERT OR REPLACE INTO {self.META} VALUES (?, ?)", (key, str(value)))
+            self.conn.commit()
+
+    def read(self, sheet_name, cols=None):
+        with self.lock:
+            if cols: self._ensure_table(sheet_name, cols)
+            if not self._columns(sheet_name): return None
+            return pd.read_sql_query(f"SELECT * FROM {_q(sheet_name)} ORDER BY rowid", self.conn)
+
+    def list_sheets(self):
+        with self.lock:
+            return [r[0] for r in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'") if r[0] != self.META]
+
+    def read_many(self, sheet_names, cols=None):
+        cols = cols or {}
+        out = {}
+        for n in sheet_names:
+            df, marker = self.read_tail(n, 0, cols.get(n))
+            if df is not None: out[n] = (df, marker)
+        return out
+
+    def row_marker(self, sheet_name):
+        with self.lock:
+            if not self._columns(sheet_name): return None
+            return self.conn.execute(f"SELECT COALESCE(MAX(rowid), -1) + 1 FROM {_q(sheet_name)}").fetchone()[0]
+
+    def read_tail(self, sheet_name, marker=0, cols=None):
+        """rowid >= marker 인 행만 읽음 → (DataFrame, 새 marker = 마지막 rowid + 1)"""
+        with self.lock:
+            if cols: self._ensure_table(sheet_name, cols)
+            if not self._columns(sheet_name): return None, marker
+            cur = self.conn.execute(f"SELECT rowid, * FROM {_q(sheet_name)} WHERE rowid >= ? ORDER BY rowid", (marker,))
+            rows = cur.fetchall()
+            names = [d[0] for d in cur.description][1:]
+        df = pd.DataFrame([r[1:] for r in rows], columns=names, index=[r[0] for r in rows])
+        return df, (rows[-1][0] + 1 if rows else marker)
+
+    def header(self, sheet_name, cols=None, refresh=False):
+        with self.lock:
+            if cols: self._ensure_table(sheet_name, cols)
+            return self._columns(sheet_name) or None
+
+    def write(self, df, sheet_name, mirror=True):
+        cols = [str(c) for c in df.columns]
+        rows = [[_cell_value(v) for v in r] for r in df.itertuples(index=False)]
+        with self.lock:
+            self.conn.execute(f"DROP TABLE IF EXISTS {_q(sheet_name)}")
+            self._ensure_table(sheet_name, cols)
+            if rows:
+                self.conn.executemany(f"INSERT INTO {_q(sheet_name)} VALUES ({', '.join('?' * len(cols))})", rows)
+            self.conn.commit()
+        if mirror: self._mirror_table(sheet_name, df)
+        return True
+
+    def append(self, rows, sheet_name, cols=None):
+        with self.lock:
+            if cols: self._ensure_table(sheet_name, cols)
+            n = len(self._columns(sheet_name))
+            if not n: return False
+            sql = f"INSERT INTO {_q(sheet_name)} VALUES ({', '.join('?' * n)})"
+            keys = [self.conn.execute(sql, (list(r) + [""] * n)[:n]).lastrowid for r in rows]
+            self.conn.commit()
+        self._mirror_rows(sheet_name, lambda: self.mirror.append(rows, sheet_name, cols))
+        return keys
+
+    def update_cells(self, sheet_name, cells):
+        with self.lock:
+            for key, col, v in cells:
+                self.conn.execute(f"UPDATE {_q(sheet_name)} SET {_q(col)} = ? WHERE rowid = ?", (_cell_value(v), key))
+            self.conn.commit()
+            pos = self._positions(sheet_name, {key for key, _, _ in cells}) if self.mirror else {}
+        moved = [(pos[key], col, v) for key, col, v in cells if key in pos]
+        self._mirror_rows(sheet_name, lambda: self.mirror.update_cells(sheet_name, moved) if moved else True)
+        return True
+
+    def delete_rows(self, sheet_name, keys):
+        keys = sorted(set(keys))
+        with self.lock:
+            pos = self._positions(sheet_name, keys) if self.mirror else {}
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                self.conn.execute(f"DELETE FROM {_q(sheet_name)} WHERE rowid IN ({', '.join('?' * len(chunk))})", chunk)
+            self.conn.commit()
+        rows = sorted(pos.values())
+        self._mirror_rows(sheet_name, lambda: self.mirror.delete_rows(sheet_name, rows) if rows else True)
+        return True
+
+    def add_column(self, sheet_name, col):
+        with self.lock:
+            if col not in self._columns(sheet_name):
+                self.conn.execute(f"ALTER TABLE {_q(sheet_name)} ADD COLUMN {_q(col)}")
+                self._ensure_table(sheet_name, [col])
+        self._mirror_rows(sheet_name, lambda: self.mirror.add_column(sheet_name, col))
+        return True
+
+    def _positions(self, sheet_name, keys):
+        # rowid → 미러 시트의 데이터 행 순번 (미러 시트는 테이블과 같은 행을 rowid 순서로 가짐). 없는 rowid는 제외
+        rowids = [r[0] for r in self.conn.execute(f"SELECT rowid FROM {_q(sheet_name)} ORDER BY rowid")]
+        pos = {k: bisect.bisect_left(rowids, k) for k in keys}
+        return {k: i for k, i in pos.items() if i < len(rowids) and rowids[i] == k}
+
+    def _mirror_rows(self, sheet_name, send):
+        # 변경된 행/셀만 미러에 반영. 전송이 실패했거나, 이전 실패로 미러 행 위치를 믿을 수 없으면 테이블 전체를 다시 씀
+        if not self.mirror: return
+        if sheet_name not in self.dirty:
+            try:
+                if send() is not False: return
+            except Exception as e: logger.warning("sqlite 미러 반영 실패 %s: %s", sheet_name, e)
+        self._mirror_table(sheet_name)
+
+    def _mirror_table(self, sheet_name, df=None):
+        # 미러 시트 전체를 다시 씀. 실패하면 시트를 표시해 두고 다음 변경 때 다시 전체 전송 (위치 기반 수정은 하지 않음)
+        if not self.mirror: return
+        try: ok = self.mirror.write(self.read(sheet_name).fillna("") if df is None else df, sheet_name) is not False
+        except Exception as e:
+            logger.warning("sqlite 미러 전체 전송 실패 %s: %s", sheet_name, e)
+            ok = False
+        self._set_dirty(sheet_name, not ok)
+
+    def _set_dirty(self, sheet_name, dirty):
+        if dirty == (sheet_name in self.dirty): return
+        if dirty: self.dirty.add(sheet_name)
+        else: self.dirty.discard(sheet_name)
+        self.set_meta(f"mirror_dirty:{sheet_name}", 1 if dirty else None)
+
+    def import_from(self, other):
+        """다른 저장소(보통 Google Sheets)의 전체 데이터를 로컬로 가져옴 (최초 전환용, 월 파티션 포함).
+        시트마다 완료를 기록하고 전체가 끝나야 "imported"를 남김 → 중간에 실패하면 다음 시작 때 남은 시트부터 다시 가져옴"""
+        names = list(SHEET_COLS) + [n for n in other.list_sheets() if n not in SHEET_COLS and _base_sheet(n) in SHEET_COLS]
+        for sheet_name in names:
+            if self.meta(f"imported:{sheet_name}"): continue
+            cols = SHEET_COLS[_base_sheet(sheet_name)]
+            df = other.read(sheet_name, cols)
+            if df is None: continue
+            df = df.dropna(how='all')
+            # 원본 시트에 빈 행이 있었으면 rowid 순서와 시트 행 위치가 어긋남 → 첫 미러 변경 때 전체를 다시 씀
+            if self.mirror is other and not df.index.equals(pd.RangeIndex(len(df))): self._set_dirty(sheet_name, True)
+            df = df.dropna(axis=1, how='all').fillna("")
+            for c in cols:
+                if c not in df.columns: df[c] = ""
+            self.write(df, sheet_name, mirror=False)
+            self.set_meta(f"imported:{sheet_name}", 1)
+        self.set_meta("imported", 1)
+
+@st.cache_resource
+def get_backend():
+    sheets = SheetsBackend()
+    if STORAGE_BACKEND == "sqlite":
+        backend = SQLiteBackend(SQLITE_PATH, mirror=sheets if SQLITE_MIRROR else None)
+        # 최초 전환: Google Sheets의 기존 데이터를 가져옴 (완료 표시가 남을 때까지 시작할 때마다 남은 시트를 다시 시도)
+        if not backend.meta("imported"):
+            try: backend.import_from(sheets)
+            except Exception as e: logger.warning("sqlite 최초 가져오기 실패: %s", e)
+        return backend
+    return sheets
 
 def get_now():
     return datetime.now(timezone(timedelta(hours=9)))
 
-@st.cache_data(ttl=60)
+def _empty_frame(cols=None):
+    return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
+
+def _parse_dates(s):
+    """날짜 컬럼 → datetime64 (시간 제거). "2026-10-18", "2026-10-18 09:00:00+09:00", 로케일 표시형 "2026. 10. 18" 등 혼재 허용"""
+    s = s.astype(str).str.strip().str.replace(r"[+-]\d{2}:\d{2}$", "", regex=True).str.rstrip(".")
+    return pd.to_datetime(s, errors='coerce', format='mixed').dt.normalize()
+
+def _apply_schema(df, sheet_name):
+    """SHEET_SCHEMAS에 따라 컬럼 타입 변환 → 새 프레임 반환 (공유 원본 프레임은 수정하지 않음)"""
+    schema = SHEET_SCHEMAS.get(_base_sheet(sheet_name))
+    if not schema: return df
+    conv = {}
+    for col, kind in schema.items():
+        if col not in df.columns: continue
+        s = df[col]
+        if kind == "date": conv[col] = _parse_dates(s)
+        elif kind == "datetime": conv[col] = _to_kst_naive(s)
+        elif kind == "int": conv[col] = pd.to_numeric(s.astype(str).str.replace(",", ""), errors='coerce').fillna(0).astype("int32")
+        elif kind == "cat": conv[col] = s.astype(str).astype("category")
+    return df.assign(**conv)
+
+def _clean_frame(df, cols=None):
+    df = df.dropna(how='all').dropna(axis=1, how='all')
+    df = df.fillna("")
+    if cols:
+        for c in cols:
+            if c not in df.columns: df[c] = ""
+    return df
+
+class SheetStore:
+    """시트별 DataFrame 원본을 프로세스 전체에서 공유하는 write-through 캐시.
+    utils를 통한 추가/저장은 원격에 쓴 뒤 캐시 프레임에 바로 반영하고,
+    원격 대조(CACHE_TTL마다)는 추가 전용 시트는 tail 동기화, 그 외는 행 수가 다를 때만 다시 읽음"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.sheets = {}  # 시트명 -> {"df", "marker": 다음 행 key, "synced", "checked", "stale"}
+        self.local = {}   # 시트명 -> 쓰기 대기열에 있어 아직 원격에 없는 행 프레임 목록 (순서 유지)
+        self.indexes = {} # (시트명, 컬럼) -> (색인을 만든 프레임, {값: 행 key})
+        self.rollups = {} # (시트명, 이름) -> (집계한 프레임, {그룹 키: 값}, 집계 함수, 병합 함수)
+        self.writes = {}  # 시트명 -> 캐시 프레임 변경 횟수
+        self.saved = {}   # 시트명 -> (스냅샷 저장 시각, 저장 당시 변경 횟수)
+        self.restored = set()  # 스냅샷으로 시작한 시트 (프로세스당 한 번만)
+
+    def sync(self, sheet_name, cols=None):
+        """캐시 항목을 (필요하면 원격과 대조해) 최신으로 유지하고 반환. 대기 행은 합치지 않음"""
+        backend = get_backend()
+        with self.lock:
+            prev = ent = self.sheets.get(sheet_name)
+            now = time.time()
+            if ent and now - ent["synced"] > FULL_RESYNC_SEC: ent = None
+            if ent is None and sheet_name not in self.restored and self._snapshots_on():
+                self.restored.add(sheet_name)
+                ent = self._load_snapshot(sheet_name, cols)
+                if ent: threading.Thread(target=self._reconcile, args=(sheet_name, cols), daemon=True, name=f"smt-reconcile-{sheet_name}").start()
+            if ent is None: ent = self._fetch(backend, sheet_name, cols)
+            elif ent["stale"] or now - ent["checked"] >= CACHE_TTL: ent = self._revalidate(backend, sheet_name, cols, ent)
+            if ent is None: return None
+            self.sheets[sheet_name] = ent
+            if prev is None or ent["df"] is not prev["df"]:
+                self._touch(sheet_name)
+                # 원격(시트 직접 수정, 다른 인스턴스)의 변경이 들어옴 → 버전을 올려 이 시트에 의존하는 파생 캐시도 다시 계산
+                if prev is not None and not ent["df"].equals(prev["df"]): invalidate(sheet_name)
+            self._maybe_save_snapshot(sheet_name, ent)
+            return ent
+
+    def get(self, sheet_name, cols=None):
+        with self.lock:
+            ent = self.sync(sheet_name, cols)
+            if ent is None: return None
+            local = self.local.get(sheet_name)
+            if local:
+                pending = pd.concat(local)
+                pending.index = range(-len(pending), 0)  # 아직 원격 위치가 없는 행은 음수 key
+                return pd.concat([ent["df"], pending]).fillna("")
+            return ent["df"]
+
+    def _fetch(self, backend, sheet_name, cols):
+        raw, marker = backend.read_tail(sheet_name, 0, cols)
+        if raw is None: return None
+        now = time.time()
+        return {"df": _clean_frame(raw, cols), "marker": marker, "synced": now, "checked": now, "stale": False}
+
+    def _revalidate(self, backend, sheet_name, cols, ent):
+        if self.local.get(sheet_name): return ent  # 대기 중인 쓰기가 전송된 뒤에 대조
+        if _base_sheet(sheet_name) in APPEND_ONLY_SHEETS:
+            raw, marker = backend.read_tail(sheet_name, ent["marker"], cols)
+            if raw is None: return ent
+            new = raw.dropna(how='all')
+            df = ent["df"]
+            if not new.empty:
+                df = _clean_frame(pd.concat([ent["df"], new]), cols)
+                self._extend_rollups(sheet_name, ent["df"], df, new.fillna(""))
+            return {**ent, "df": df, "marker": marker, "checked": time.time(), "stale": False}
+        if ent["stale"] or sheet_name in REFETCH_SHEETS or backend.row_marker(sheet_name) != ent["marker"]:
+            return self._fetch(backend, sheet_name, cols)
+        return {**ent, "checked": time.time()}
+
+    def has(self, sheet_name):
+        return sheet_name in self.sheets
+
+    def refresh(self, sheet_name):
+        """다음 조회 때 원격 전체를 다시 읽도록 표시 (캐시 값이 아닌 원격 값을 기준으로 계산해서 써야 하는 경우)"""
+        with self.lock:
+            ent = self.sheets.get(sheet_name)
+            if ent: ent["stale"] = True
+
+    def patch_append(self, sheet_name, header, rows, keys):
+        """추가한 행을 캐시 프레임 끝에 붙임. 원격 위치가 캐시와 어긋나면 다음 조회 때 다시 동기화"""
+        with self.lock:
+            ent = self.sheets.get(sheet_name)
+            if ent is None: return
+            if not isinstance(keys, list) or not keys or keys[0] != ent["marker"]:
+                ent["stale"] = True
+                return
+            width = len(header)
+            new = pd.DataFrame([(list(r) + [""] * width)[:width] for r in rows], columns=header, index=keys)
+            df = pd.concat([ent["df"], new])
+            if df.isna().any().any(): df = df.fillna("")
+            for (name, col), (src, idx) in self.indexes.items():
+                if name != sheet_name or src is not ent["df"] or col not in new.columns: continue
+                for k, v in zip(new.index, new[col].astype(str)): idx.setdefault(v, k)
+                self.indexes[(name, col)] = (df, idx)
+            self._extend_rollups(sheet_name, ent["df"], df, new)
+            self.sheets[sheet_name] = {**ent, "df": df, "marker": keys[-1] + 1}
+            self._touch(sheet_name)
+
+    def patch_cells(self, sheet_name, cells):
+        """수정한 셀을 저장소에 쓴 값(_cell_value) 그대로 캐시 프레임에 반영"""
+        with self.lock:
+            ent = self.sheets.get(sheet_name)
+            if ent is None: return
+            df = ent["df"]
+            for key, col, v in cells:
+                if key not in df.index or col not in df.columns:
+                    ent["stale"] = True
+                    continue
+                v = _cell_value(v)
+                # 컬럼 타입과 다른 값(str 컬럼에 int 등)은 pandas 3에서 TypeError → object로 바꾼 뒤 기록
+                if df[col].dtype != object: df[col] = df[col].astype(object)
+                df.at[key, col] = v
+                self.indexes.pop((sheet_name, col), None)
+            for k in [k for k in self.rollups if k[0] == sheet_name]: self.rollups.pop(k)  # 같은 프레임이 수정됨 → 재집계
+            self._touch(sheet_name)
+
+    def patch_delete(self, sheet_name, keys, shifts):
+        """삭제한 행을 캐시 프레임에서 제거. shifts=True(시트)면 아래 행들의 key를 당겨서 맞춤"""
+        with self.lock:
+            ent = self.sheets.get(sheet_name)
+            if ent is None: return
+            gone = sorted(set(keys))
+            df = ent["df"].drop(index=[k for k in gone if k in ent["df"].index])
+            marker = ent["marker"]
+            if shifts:
+                df.index = df.index - np.searchsorted(gone, df.index.values)
+                marker -= len(gone)
+            for k in [k for k in self.indexes if k[0] == sheet_name]: self.indexes.pop(k)
+            self.sheets[sheet_name] = {**ent, "df": df, "marker": marker}
+            self._touch(sheet_name)
+
+    def lookup(self, sheet_name, col):
+        """컬럼 값 -> 행 key 색인 (프레임이 바뀔 때만 다시 만들고, 추가된 행은 이어서 반영). 중복 값은 첫 행"""
+        with self.lock:
+            ent = self.sheets.get(sheet_name)
+            if ent is None or col not in ent["df"].columns: return {}
+            cached = self.indexes.get((sheet_name, col))
+            if cached is None or cached[0] is not ent["df"]:
+                df = ent["df"]
+                cached = (df, dict(zip(df[col].astype(str).iloc[::-1], df.index[::-1])))
+                self.indexes[(sheet_name, col)] = cached
+            return cached[1]
+
+    def rollup(self, sheet_name, name, fn, merge=operator.add):
+        """fn(프레임) -> {그룹 키: 값} 집계를 유지 (프레임이 바뀔 때만 전체 재계산, 추가된 행은 merge(기존 값, 새 값)로 이어서 반영).
+        반환 dict는 캐시와 공유되므로 호출 측에서 복사해서 사용"""
+        with self.lock:
+            ent = self.sheets.get(sheet_name)
+            if ent is None: return {}
+            cached = self.rollups.get((sheet_name, name))
+            if cached is None or cached[0] is not ent["df"]:
+                cached = (ent["df"], fn(ent["df"]), fn, merge)
+                self.rollups[(sheet_name, name)] = cached
+            return cached[1]
+
+    def _extend_rollups(self, sheet_name, old, df, new):
+        for key, (src, acc, fn, merge) in list(self.rollups.items()):
+            if key[0] != sheet_name or src is not old: continue
+            for k, v in fn(new).items(): acc[k] = merge(acc[k], v) if k in acc else v
+            self.rollups[key] = (df, acc, fn, merge)
+
+    def add_local(self, sheet_name, header, rows):
+        """쓰기 대기열에 넣은 행을 바로 조회 결과에 보이도록 보관"""
+        width = len(header)
+        new = pd.DataFrame([(list(r) + [""] * width)[:width] for r in rows], columns=header)
+        with self.lock: self.local.setdefault(sheet_name, []).append(new)
+
+    def confirm_local(self, sheet_name, header, rows, keys):
+        """대기열 전송 완료: 가장 오래된 대기 행들을 원격 행(key 포함)으로 전환"""
+        with self.lock:
+            self.discard_local(sheet_name, len(rows))
+            self.patch_append(sheet_name, header, rows, keys)
+
+    def discard_local(self, sheet_name, count):
+        with self.lock:
+            n, local = count, self.local.get(sheet_name, [])
+            while n > 0 and local:
+                head = local[0]
+                if len(head) <= n:
+                    n -= len(head)
+                    local.pop(0)
+                else:
+                    local[0] = head.iloc[n:]
+                    n = 0
+
+    def replace(self, sheet_name, df, first_key):
+        """시트 전체를 다시 쓴 경우: 쓴 프레임을 그대로 캐시로 사용"""
+        with self.lock:
+            df = _clean_frame(df, SHEET_COLS.get(sheet_name))
+            df.index = range(first_key, first_key + len(df))
+            now = time.time()
+            self.sheets[sheet_name] = {"df": df, "marker": first_key + len(df), "synced": now, "checked": now, "stale": False}
+            self._touch(sheet_name)
+
+    def drop(self, sheet_name=None):
+        with self.lock:
+            for name in ([sheet_name] if sheet_name else list(self.sheets)): self._touch(name)
+            if sheet_name: self.sheets.pop(sheet_name, None)
+            else: self.sheets.clear()
+        # 다음 조회는 원격에서 새로 읽음 → 파생 캐시도 그 결과로 다시 계산
+        if sheet_name: invalidate(sheet_name)
+        else: invalidate()
+
+    def prefetch(self, sheet_names):
+        """캐시에 없거나 전체 동기화 주기가 지난 시트들을 한 번의 일괄 요청으로 읽어 채움
+        (스냅샷으로 바로 시작할 수 있는 시트는 제외)"""
+        backend = get_backend()
+        with self.lock:
+            now = time.time()
+            todo = [n for n in dict.fromkeys(sheet_names) if self._needs_fetch(n, now)]
+        if not todo: return
+        cols = {n: SHEET_COLS.get(_base_sheet(n)) for n in todo}
+        frames = backend.read_many(todo, cols)  # 잠금 밖에서 원격 요청
+        with self.lock:
+            now = time.time()
+            for n, (raw, marker) in frames.items():
+                if not self._needs_fetch(n, now): continue  # 그사이 다른 조회가 채움
+                self.restored.add(n)
+                ent = {"df": _clean_frame(raw, cols[n]), "marker": marker, "synced": now, "checked": now, "stale": False}
+                prev = self.sheets.get(n)
+                self.sheets[n] = ent
+                self._touch(n)
+                if prev is not None and not ent["df"].equals(prev["df"]): invalidate(n)
+                self._maybe_save_snapshot(n, ent)
+
+    def _needs_fetch(self, sheet_name, now):
+        ent = self.sheets.get(sheet_name)
+        if ent is not None: return now - ent["synced"] > FULL_RESYNC_SEC
+        return sheet_name in self.restored or not self._snapshots_on() or not os.path.exists(_snapshot_path(sheet_name))
+
+    def _touch(self, sheet_name):
+        self.writes[sheet_name] = self.writes.get(sheet_name, 0) + 1
+
+    # --- 로컬 스냅샷 ---
+    def _snapshots_on(self):
+        return SNAPSHOT_ENABLED and HAS_ARROW and get_backend().name == "sheets"  # SQLite는 이미 로컬
+
+    def _load_snapshot(self, sheet_name, cols):
+        try:
+            table = pq.read_table(_snapshot_path(sheet_name), memory_map=True)
+            marker = int(table.schema.metadata[b"smt_marker"])
+            df = table.to_pandas()
+        except: return None
+        now = time.time()
+        self.saved[sheet_name] = (now, self.writes.get(sheet_name, 0))
+        return {"df": _clean_frame(df, cols), "marker": marker, "synced": now, "checked": now, "stale": False}
+
+    def _reconcile(self, sheet_name, cols):
+        """스냅샷으로 시작한 시트를 백그라운드에서 원격 전체와 대조. 그사이 쓰기가 있었으면 다음 조회 때 전체 동기화"""
+        with self.lock: gen = self.writes.get(sheet_name, 0)
+        try: fresh = self._fetch(get_backend(), sheet_name, cols)
+        except Exception as e:
+            logger.warning("snapshot 대조 실패 %s: %s", sheet_name, e)
+            fresh = None
+        with self.lock:
+            cur = self.sheets.get(sheet_name)
+            if fresh is not None and self.writes.get(sheet_name, 0) == gen:
+                self.sheets[sheet_name] = fresh
+                self._touch(sheet_name)
+                self._maybe_save_snapshot(sheet_name, fresh, force=True)
+            elif cur is not None: cur["synced"] = 0
+        invalidate(sheet_name)
+
+    def _maybe_save_snapshot(self, sheet_name, ent, force=False):
+        if not self._snapshots_on(): return
+        last, gen = self.saved.get(sheet_name, (0, None))
+        if gen == self.writes.get(sheet_name, 0) or (not force and time.time() - last < SNAPSHOT_SAVE_SEC): return
+        self.saved[sheet_name] = (time.time(), self.writes.get(sheet_name, 0))
+        df = _snapshot_frame(ent["df"])  # 저장 중 원본 수정과 겹치지 않도록 복사
+        meta = {"smt_marker": str(ent["marker"]), "smt_fetched": str(ent["synced"]), "smt_version": str(data_version(sheet_name))}
+        threading.Thread(target=_write_snapshot, args=(sheet_name, df, meta), daemon=True, name=f"smt-snapshot-{sheet_name}").start()
+
+    def save_snapshots(self):
+        """변경된 모든 시트의 스냅샷을 즉시 저장 (프로세스 종료 시)"""
+        if not self._snapshots_on(): return
+        with self.lock:
+            jobs = []
+            for name, ent in self.sheets.items():
+                gen = self.writes.get(name, 0)
+                if self.saved.get(name, (0, None))[1] == gen: continue
+                self.saved[name] = (time.time(), gen)
+                jobs.append((name, _snapshot_frame(ent["df"]), {"smt_marker": str(ent["marker"]), "smt_fetched": str(ent["synced"]), "smt_version": str(data_version(name))}))
+        for job in jobs: _write_snapshot(*job)
+
+def _snapshot_frame(df):
+    """스냅샷 저장용 복사본: 원격에서 새로 읽은 프레임과 같은 값이 되도록 컬럼별로 맞춤.
+    숫자(와 빈 칸)만 있는 컬럼은 숫자 그대로, 문자열이 섞인 컬럼은 시트에 보이는 문자열(101.0 → "101")"""
+    out = {}
+    for c in df.columns:
+        s = df[c]
+        if s.dtype != object:
+            out[c] = s.copy()
+            continue
+        num = s.map(lambda v: isinstance(v, (int, float, np.number)) and not isinstance(v, (bool, np.bool_)))
+        if (num | (s == "")).all() and num.any(): out[c] = pd.to_numeric(s.where(num, np.nan))
+        else: out[c] = s.map(lambda v: _key_str(v) if isinstance(v, float) else str(v))
+    return pd.DataFrame(out, index=df.index, columns=df.columns)
+
+def _snapshot_path(sheet_name):
+    return os.path.join(SNAPSHOT_DIR, f"{sheet_name}.parquet")
+
+def _write_snapshot(sheet_name, df, meta):
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **{k.encode(): v.encode() for k, v in meta.items()}})
+        path = _snapshot_path(sheet_name)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+    except Exception as e: logger.warning("snapshot 저장 실패 %s: %s", sheet_name, e)
+
+@st.cache_resource
+def get_store():
+    store = SheetStore()
+    atexit.register(store.save_snapshots)
+    return store
+
+class WriteQueue:
+    """시트별로 추가 행을 모아 WRITE_FLUSH_SEC마다(또는 WRITE_FLUSH_SIZE 도달 시) append_rows 1회로 전송.
+    429/5xx/네트워크 오류는 지수 백오프로 WRITE_RETRY_MAX_ATTEMPTS회까지 재시도, 실패한 행은 failed 목록에 남겨 화면에 알림"""
+
+    def __init__(self, backend, store):
+        self.backend, self.store = backend, store
+        self.cond = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.pending = {}  # 시트명 -> {"header", "cols", "rows"}
+        self.failed = []   # (순번, 시트명, rows, 오류 메시지, 시각) 최근 100건
+        self.fail_seq = 0
+        threading.Thread(target=self._run, daemon=True, name="smt-write-queue").start()
+        atexit.register(self.flush)
+
+    def put(self, sheet_name, header, rows, cols=None):
+        with self.cond:
+            buf = self.pending.setdefault(sheet_name, {"header": header, "cols": cols, "rows": []})
+            buf["rows"].extend(rows)
+            if len(buf["rows"]) >= WRITE_FLUSH_SIZE: self.cond.notify()
+
+    def pending_count(self, sheet_name=None):
+        with self.cond:
+            if sheet_name: return len(self.pending.get(sheet_name, {}).get("rows", []))
+            return sum(len(b["rows"]) for b in self.pending.values())
+
+    def flush(self, sheet_name=None):
+        """대기 중인 행을 즉시 전송 (전체 저장/삭제처럼 순서가 중요한 작업 전에 호출)"""
+        with self.flush_lock:
+            with self.cond:
+                if sheet_name:
+                    batch = {sheet_name: self.pending.pop(sheet_name)} if sheet_name in self.pending else {}
+                else:
+                    batch, self.pending = self.pending, {}
+            for name, buf in batch.items(): self._send(name, buf)
+
+    def _run(self):
+        while True:
+            with self.cond: self.cond.wait(timeout=WRITE_FLUSH_SEC)
+            try: self.flush()
+            except Exception: logger.exception("write-queue 전송 오류")
+
+    def _send(self, sheet_name, buf):
+        rows, attempt = buf["rows"], 0
+        while True:
+            try:
+                keys = self.backend.append(rows, sheet_name, buf["cols"])
+                if not keys: raise RuntimeError("worksheet not available")
+                self.store.confirm_local(sheet_name, buf["header"], rows, keys)
+                break
+            except Exception as e:
+                if _is_retryable(e) and attempt + 1 < WRITE_RETRY_MAX_ATTEMPTS:
+                    time.sleep(min(2 ** attempt, WRITE_RETRY_MAX_SEC) + random.random())
+                    attempt += 1
+                    continue
+                with self.cond:
+                    self.fail_seq += 1
+                    self.failed = (self.failed + [(self.fail_seq, sheet_name, rows, str(e), get_now())])[-100:]
+                self.store.discard_local(sheet_name, len(rows))
+                logger.error("write-queue %s: %d행 저장 실패 (%d회 시도) - %s", sheet_name, len(rows), attempt + 1, e)
+                break
+        invalidate(sheet_name)
+
+    def failures_since(self, seq):
+        with self.cond: return [f for f in self.failed if f[0] > seq]
+
+@st.cache_resource
+def get_write_queue():
+    backend = get_backend()
+    if not WRITE_BEHIND or not isinstance(backend, SheetsBackend): return None
+    return WriteQueue(backend, get_store())
+
+def prefetch(*sheet_names):
+    """여러 시트를 동시에(일괄 요청 1회) 캐시에 채움 → 이후 load_data는 원격 왕복 없이 캐시에서 읽음"""
+    try: get_store().prefetch(sheet_names)
+    except Exception as e: logger.warning("prefetch 실패: %s", e)
+
+def show_write_failures():
+    """백그라운드 전송에 최종 실패한 행을 알림 (세션마다 새 실패만, 다시 입력할 수 있도록 행 내용 표시)"""
+    q = get_write_queue()
+    if not q: return
+    if "_write_fail_seen" not in st.session_state:
+        st.session_state._write_fail_seen = q.fail_seq  # 세션 시작 전의 실패는 표시하지 않음
+        return
+    new = q.failures_since(st.session_state._write_fail_seen)
+    for seq, sheet_name, rows, err, ts in new:
+        st.error(f"⚠️ {sheet_name}: {len(rows)}행이 저장되지 않았습니다 ({ts:%H:%M:%S}, {err}). 내용을 확인하고 다시 입력해 주세요.")
+        with st.expander("저장되지 않은 행 보기"): st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+    if new: st.session_state._write_fail_seen = new[-1][0]
+
+def flush_writes(sheet_name=None):
+    q = get_write_queue()
+    if q: q.flush(sheet_name)
+
+def read_sheet(sheet_name, cols=None):
+    """원격 저장소에서 시트 전체를 직접 읽음 (대기 중인 쓰기를 먼저 전송)"""
+    flush_writes(sheet_name)
+    return get_backend().read(sheet_name, cols)
+
+@st.cache_resource
+def _version_state():
+    # 프로세스 전체 공유: 시트별 데이터 버전 (해당 시트에 쓰기가 일어날 때만 증가)
+    return {"lock": threading.Lock(), "v": {}}
+
+def data_version(*sheet_names):
+    v = _version_state()["v"]
+    return tuple(v.get(s, 0) for s in sheet_names)
+
+def invalidate(*sheet_names):
+    """지정한 시트의 버전을 올려 해당 시트(와 이를 의존하는 파생 캐시)만 무효화. 인자가 없으면 전체"""
+    state = _version_state()
+    with state["lock"]:
+        for s in sheet_names or list(set(SHEET_COLS) | set(state["v"])):
+            state["v"][s] = state["v"].get(s, 0) + 1
+
+def depends_on(*sheet_names):
+    """파생 캐시 선언: 의존 시트들의 버전을 첫 인자(캐시 키)로 넘겨, 그 시트가 바뀔 때만 다시 계산.
+    버전을 읽기 전에 시트를 원격과 대조(CACHE_TTL마다)해서 시트에서 직접 고친 내용도 버전에 반영되게 함
+    (캐시가 적중하면 load_data를 부르지 않으므로 여기서 대조하지 않으면 원격 변경을 볼 기회가 없음)"""
+    def deco(cached_func):
+        @functools.wraps(cached_func)
+        def wrapper(*args, **kwargs):
+            store = get_store()
+            for s in sheet_names:
+                try: store.sync(s, SHEET_COLS.get(s))
+                except Exception as e: logger.warning("원격 대조 실패 %s: %s", s, e)
+            return cached_func(data_version(*sheet_names), *args, **kwargs)
+        wrapper.sheets = sheet_names
+        return wrapper
+    return deco
+
 def load_data(sheet_name, cols=None):
+    return _load_data_cached(sheet_name, cols, data_version(sheet_name))
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=64)
+def _load_data_cached(sheet_name, cols, version):
     try:
-        ws = get_worksheet(sheet_name, create_cols=cols)
-        if not ws: return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
-        df = get_as_dataframe(ws, evaluate_formulas=True)
-        if df.empty: return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
-        df = df.dropna(how='all').dropna(axis=1, how='all')
-        df = df.fillna("")
-        if cols:
-            for c in cols:
-                if c not in df.columns: df[c] = ""
-        return df
-    except: return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
+        df = get_store().get(sheet_name, cols)
+        if df is None or df.empty: return _apply_schema(_empty_frame(cols), sheet_name)
+        return _apply_schema(df, sheet_name)
+    except: return _empty_frame(cols)
 
 def clear_cache():
-    load_data.clear()
-    get_dashboard_stats.clear()
+    invalidate()
 
 def save_data(df, sheet_name):
     try:
-        ws = get_worksheet(sheet_name)
-        if ws:
-            df = df.fillna("")
-            ws.clear()
-            set_with_dataframe(ws, df)
-            clear_cache()
+        flush_writes(sheet_name)
+        df = _serialize_frame(df)
+        backend = get_backend()
+        if backend.write(df, sheet_name):
+            get_store().replace(sheet_name, df, backend.first_key)
+            invalidate(sheet_name)
             return True
         return False
-    except: return False
+    except:
+        get_store().drop(sheet_name)
+        return False
 
 def append_data(data_dict, sheet_name):
     try:
-        ws = get_worksheet(sheet_name)
-        if ws:
-            try: headers = ws.row_values(1)
-            except: headers = list(data_dict.keys())
-            row = [str(data_dict.get(h, "")) for h in headers]
-            ws.append_row(row)
-            clear_cache()
-            return True
-        return False
+        if sheet_name in ID_SHEETS and not data_dict.get(COL_ID): data_dict = {**data_dict, COL_ID: new_row_id()}
+        backend = get_backend()
+        headers = backend.header(sheet_name)
+        if headers and set(data_dict) - set(headers): headers = backend.header(sheet_name, refresh=True)
+        headers = headers or list(data_dict.keys())
+        row = [str(data_dict.get(h, "")) for h in headers]
+        return _append(sheet_name, headers, [row])
     except: return False
 
 def append_rows(rows, sheet_name, cols):
     try:
-        ws = get_worksheet(sheet_name, create_cols=cols)
-        if ws:
-            safe_rows = [[str(c) if c is not None else "" for c in r] for r in rows]
-            ws.append_rows(safe_rows)
-            clear_cache()
-            return True
+        safe_rows = [[str(c) if c is not None else "" for c in r] for r in rows]
+        return _append(sheet_name, None, safe_rows, cols)
     except: return False
 
+def _append(sheet_name, header, rows, cols=None, queued=True):
+    backend, store = get_backend(), get_store()
+    if header is None and store.has(sheet_name): header = backend.header(sheet_name, cols) or cols
+    q = get_write_queue() if queued else None
+    if q:
+        # 쓰기 지연: 캐시에 먼저 반영해 즉시 응답하고, 전송은 백그라운드에서 묶어서 처리
+        remote_header = backend.header(sheet_name, cols)
+        if remote_header is None: return False  # 시트에 연결할 수 없음
+        header = header or remote_header
+        # 대기 행을 먼저 보관한 뒤 대기열에 넣음 (반대 순서면 그사이 전송 완료 시 confirm_local이 지울 행이 없어 중복으로 남음)
+        store.add_local(sheet_name, header, rows)
+        q.put(sheet_name, header, rows, cols)
+        invalidate(sheet_name)
+        return True
+    keys = backend.append(rows, sheet_name, cols)
+    if not keys: return False
+    if header: store.patch_append(sheet_name, header, rows, keys)
+    invalidate(sheet_name)
+    return True
+
+def new_row_id():
+    return uuid.uuid4().hex[:12]
+
+def _ensure_row_ids(sheet_name):
+    """레코드ID 컬럼이 없으면 추가하고, ID가 비어 있는 행에 ID 부여 (변경이 있었으면 True)"""
+    store, backend = get_store(), get_backend()
+    with store.lock:
+        df = store.get(sheet_name, SHEET_COLS.get(sheet_name))
+        if df is None: return False
+        header = backend.header(sheet_name) or []
+        if COL_ID not in header and not backend.add_column(sheet_name, COL_ID): return False
+        blank = df.index[(df[COL_ID].astype(str) == "") & (df.index >= 0)]
+        if not len(blank):
+            if COL_ID in header: return False
+            invalidate(sheet_name)
+            return True
+        return update_cells(sheet_name, [(k, COL_ID, new_row_id()) for k in blank])
+
+def ensure_row_ids(*sheet_names):
+    """레코드ID가 비어 있는 행(시트에서 직접 추가한 행 등)에 ID를 채움.
+    조회(load_data)는 쓰지 않으므로, 레코드ID로 행을 골라 수정/삭제하는 관리자 화면에서 데이터를 읽기 전에 호출"""
+    for s in sheet_names:
+        try: _ensure_row_ids(s)
+        except Exception as e: logger.warning("레코드ID 채우기 실패 %s: %s", s, e)
+
+def _ids_to_keys(sheet_name, ids):
+    store = get_store()
+    store.get(sheet_name, SHEET_COLS.get(sheet_name))
+    idx = store.lookup(sheet_name, COL_ID)
+    return {str(i): idx[str(i)] for i in ids if str(i) in idx}
+
+def delete_rows(sheet_name, ids):
+    """레코드ID 목록의 행 삭제 (연속 구간으로 묶어 1회 요청, 시트 전체 재작성 없음)"""
+    ids = [i for i in ids if str(i)]
+    if not ids: return True
+    store, backend = get_store(), get_backend()
+    try:
+        flush_writes(sheet_name)
+        with store.lock:
+            keys = list(_ids_to_keys(sheet_name, ids).values())
+            if not keys or not backend.delete_rows(sheet_name, keys): return False
+            store.patch_delete(sheet_name, keys, backend.shifts_on_delete)
+        invalidate(sheet_name)
+        return True
+    except:
+        store.drop(sheet_name)
+        return False
+
+def update_rows(sheet_name, changes):
+    """{레코드ID: {컬럼: 값}} 형태의 수정 내용을 해당 셀만 갱신"""
+    store = get_store()
+    flush_writes(sheet_name)
+    with store.lock:
+        keys = _ids_to_keys(sheet_name, changes.keys())
+        cells = [(keys[str(i)], c, v) for i, cols in changes.items() if str(i) in keys for c, v in cols.items()]
+        return update_cells(sheet_name, cells)
+
+def diff_rows(original, edited, cols):
+    """data_editor 편집 결과와 원본을 레코드ID 기준으로 비교 → 바뀐 셀만 {레코드ID: {컬럼: 새 값}}"""
+    cols = [c for c in cols if c in original.columns and c in edited.columns]
+    if not cols or edited.empty: return {}
+    def norm(df): return df.drop_duplicates(COL_ID).set_index(COL_ID)[cols].fillna("").astype(str)
+    o, e = norm(original), norm(edited)
+    e = e[e.index.isin(o.index)]
+    changed = (o.loc[e.index] != e).stack()
+    changed = changed[changed]
+    new_vals = edited.drop_duplicates(COL_ID).set_index(COL_ID)
+    out = {}
+    for rid, col in changed.index: out.setdefault(rid, {})[col] = _cell_value(new_vals.at[rid, col])
+    return out
+
+def update_cells(sheet_name, cells):
+    """(행 key, 컬럼명, 값) 목록을 한 번의 요청으로 수정하고 캐시 프레임에도 반영"""
+    if not cells: return True
+    try:
+        if get_backend().update_cells(sheet_name, cells):
+            get_store().patch_cells(sheet_name, cells)
+            invalidate(sheet_name)
+            return True
+        return False
+    except:
+        get_store().drop(sheet_name)
+        return False
+
 def update_inventory(code, name, change, reason, user):
-    df = load_data(SHEET_INVENTORY, COLS_INVENTORY)
-    if not df.empty:
-        df['현재고'] = pd.to_numeric(df['현재고'], errors='coerce').fillna(0).astype(int)
-    
-    if not df.empty and code in df['품목코드'].values:
-        idx = df[df['품목코드'] == code].index[0]
-        df.at[idx, '현재고'] = df.at[idx, '현재고'] + change
-    else:
-        new_row = pd.DataFrame([{"품목코드": code, "제품명": name, "현재고": change}])
-        df = pd.concat([df, new_row], ignore_index=True)
-    
-    df = df[df['현재고'] != 0]
-    save_data(df, SHEET_INVENTORY)
+    # ledger 모드: 이력 추가만 (현재고는 get_stock에서 계산)
+    # table 모드: 품목코드 -> 행 색인으로 해당 셀만 수정, 신규 코드는 행 추가 (시트 전체 재작성 없음)
+    # 현재고 수정이 실패하면 이력을 남기지 않음 (성공 여부 반환)
+    store = get_store()
+    if INVENTORY_MODE != "ledger":
+        with store.lock:
+            if not _update_inventory_rows(store, [(code, name, change)]): return False
+    elif not seed_inventory_ledger(): return False
     
     now_kst = get_now()
     hist = {"날짜": now_kst.strftime("%Y-%m-%d"), "품목코드": code, "구분": "입고" if change > 0 else "출고", "수량": change, "비고": reason, "작성자": user, "입력시간": str(now_kst)}
-    append_data(hist, SHEET_INV_HISTORY)
+    ok = append_data(hist, SHEET_INV_HISTORY)
+    if INVENTORY_MODE == "ledger": maybe_compact_inventory()
+    return ok
+
+def _update_inventory_rows(store, moves):
+    # [(품목코드, 제품명, 증감)] (코드 중복 없음) → 기존 코드는 현재고 셀만 한 번에 수정, 신규 코드는 한 번에 행 추가 (실패 시 False)
+    # 현재고는 절대값으로 덮어쓰므로 시트에서 직접 고친 값이 사라지지 않게 원격을 다시 읽은 값에 증감을 더함
+    store.refresh(SHEET_INVENTORY)
+    df = store.get(SHEET_INVENTORY, COLS_INVENTORY)
+    index = store.lookup(SHEET_INVENTORY, "품목코드") if df is not None else {}
+    cells, new_rows = [], []
+    for code, name, change in moves:
+        key = index.get(str(code))
+        if key is not None:
+            cur = pd.to_numeric(df.at[key, '현재고'], errors='coerce')
+            cells.append((key, "현재고", (0 if pd.isna(cur) else int(cur)) + change))
+        else: new_rows.append({"품목코드": code, "제품명": name, "현재고": change, COL_ID: new_row_id()})
+    if not update_cells(SHEET_INVENTORY, cells): return False
+    if not new_rows: return True
+    headers = get_backend().header(SHEET_INVENTORY, COLS_INVENTORY) or COLS_INVENTORY
+    return _append(SHEET_INVENTORY, headers, [[str(r.get(h, "")) for h in headers] for r in new_rows], COLS_INVENTORY, queued=False)
+
+class ItemIndex:
+    """품목 검색 색인 (읽기 전용, 세션 간 공유). 코드는 대문자, 제품명은 소문자로 정규화해서 비교
+    - 접두: 정렬된 코드/제품명 목록에서 이진 탐색
+    - 부분 문자열: 한 줄에 한 품목씩 이어 붙인 문자열에서 str.find 반복 (오프셋 → 품목은 이진 탐색)
+    - 유사(오탈자): 앞의 결과가 모자랄 때만. 질의 단어마다 코드/제품명 단어의 3-gram 색인으로 후보를 추려 difflib 비율로 비교,
+      모든 질의 단어가 맞은 품목 → 일부만 맞은 품목 순, 각각 비율이 높은 단어부터 (제품명 전체가 아니라 단어 단위라 "alpah" → "Alpha board")"""
+    FUZZY_CANDIDATES = 10    # 질의 단어마다 difflib으로 비교할 최대 후보 수
+    FUZZY_MAX_POSTINGS = 50  # 이보다 많은 단어에 나오는 3-gram은 색인에서 뺌 (후보를 가르지 못하고 집계만 느려짐)
+    FUZZY_CUTOFF = 0.6
+
+    @staticmethod
+    def _trigrams(s):
+        s = f"  {s} "  # 앞뒤를 채워 짧은 문자열·단어 경계도 3-gram이 생기게 함
+        return {s[i:i + 3] for i in range(len(s) - 2)}
+
+    @staticmethod
+    def _words(s):
+        return re.findall(r"[^\s,/()\[\]_]+", s)
+
+    def __init__(self, df):
+        codes = df['품목코드'].astype(object).map(_key_str).str.upper()
+        self.names = MappingProxyType({c: n for c, n in zip(codes, df['제품명'].astype(str).str.strip()) if c})
+        self.codes = sorted(self.names)
+        self._by_name = sorted((n.lower(), c) for c, n in self.names.items())
+        lines = [f"{c.lower()}\t{self.names[c].lower()}" for c in self.codes]
+        self._starts = list(np.cumsum([0] + [len(l) + 1 for l in lines[:-1]])) if lines else []
+        self._blob = "\n".join(lines)
+        terms = {}  # 유사 검색 단어(소문자 코드, 제품명의 각 단어) -> 품목코드 목록
+        for c, n in self.names.items():
+            for t in {c.lower(), *self._words(n.lower())}: terms.setdefault(t, []).append(c)
+        self._terms, self._term_codes = list(terms), [tuple(v) for v in terms.values()]
+        grams = {}  # 3-gram -> 그 3-gram을 가진 단어 번호 목록
+        for i, t in enumerate(self._terms):
+            for g in self._trigrams(t): grams.setdefault(g, []).append(i)
+        self._grams = {g: ids for g, ids in grams.items() if len(ids) <= self.FUZZY_MAX_POSTINGS}
+
+    def _fuzzy(self, ql, limit):
+        """질의 단어별로 비슷한 색인 단어를 찾아 품목코드 최대 limit개"""
+        cut, sm = self.FUZZY_CUTOFF, difflib.SequenceMatcher(autojunk=False)
+        found, sets = [], []  # (비율, 단어 번호), 질의 단어별로 맞은 품목코드 집합
+        for tok in dict.fromkeys(self._words(ql)):
+            hits = {}
+            for g in self._trigrams(tok):
+                for i in self._grams.get(g, ()): hits[i] = hits.get(i, 0) + 1
+            sm.set_seq2(tok)
+            matched = []
+            for i in heapq.nlargest(self.FUZZY_CANDIDATES, hits, key=hits.get):
+                sm.set_seq1(self._terms[i])
+                if sm.real_quick_ratio() < cut or sm.quick_ratio() < cut: continue
+                r = sm.ratio()
+                if r >= cut: matched.append((r, i))
+            if matched:
+                found += matched
+                sets.append(set().union(*(self._term_codes[i] for _, i in matched)))
+        if not sets: return []
+        found.sort(key=lambda m: -m[0])
+        full = set.intersection(*sets)
+        out = []
+        for group in (full, set().union(*sets) - full):
+            for _, i in found:
+                for c in self._term_codes[i]:
+                    if c in group:
+                        group.discard(c)
+                        out.append(c)
+                        if len(out) >= limit: return out
+        return out
+
+    def search(self, q, limit=10):
+        """[(품목코드, 제품명)] 최대 limit개: 코드 일치 → 코드 접두 → 제품명 접두 → 부분 문자열 → 유사"""
+        q = str(q).strip()
+        if not q: return []
+        out = {}
+        def add(c):
+            if len(out) < limit: out.setdefault(c, self.names[c])
+            return len(out) >= limit
+        qu, ql = q.upper(), q.lower()
+        if qu in self.names and add(qu): return list(out.items())
+        i = bisect.bisect_left(self.codes, qu)
+        while i < len(self.codes) and self.codes[i].startswith(qu):
+            if add(self.codes[i]): return list(out.items())
+            i += 1
+        i = bisect.bisect_left(self._by_name, (ql,))
+        while i < len(self._by_name) and self._by_name[i][0].startswith(ql):
+            if add(self._by_name[i][1]): return list(out.items())
+            i += 1
+        pos = self._blob.find(ql)
+        while pos >= 0:
+            row = bisect.bisect_right(self._starts, pos) - 1
+            if add(self.codes[row]): return list(out.items())
+            pos = self._blob.find(ql, self._starts[row + 1] if row + 1 < len(self._starts) else len(self._blob))
+        for c in self._fuzzy(ql, limit):
+            if add(c): break
+        return list(out.items())
+
+@depends_on(SHEET_ITEMS)
+@st.cache_resource(max_entries=2)
+def get_item_index(version):
+    """품목 검색 색인. item_codes 버전이 바뀔 때만 다시 생성"""
+    return ItemIndex(load_data(SHEET_ITEMS, COLS_ITEMS))
+
+def _frame_rows(sheet_name, df, cols):
+    """프레임 → 원격 헤더 순서의 문자열 행 목록 (append_data와 같은 방식으로 헤더 결정)"""
+    headers = get_backend().header(sheet_name, cols) or cols
+    return headers, df.reindex(columns=headers, fill_value="").astype(str).values.tolist()
+
+def read_import_file(file):
+    """업로드한 엑셀/CSV → 문자열 프레임 (CSV는 UTF-8, 안 되면 CP949)"""
+    if getattr(file, "name", str(file)).lower().endswith(".csv"):
+        try: df = pd.read_csv(file, dtype=str, encoding="utf-8-sig")
+        except UnicodeDecodeError:
+            file.seek(0)
+            df = pd.read_csv(file, dtype=str, encoding="cp949")
+    else: df = pd.read_excel(file, dtype=str)
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+def prepare_production_import(raw, default_date, default_cat):
+    """일괄 등록할 원본 프레임 검증 → (저장할 실적 프레임, 오류 행 프레임[사유 포함]).
+    품목코드는 item_codes와 한 번의 조인으로 확인하고, 비어 있는 날짜/구분/제품명은 기본값과 기준정보로 채움"""
+    missing = [c for c in ["품목코드", "수량"] if c not in raw.columns]
+    if missing: raise ValueError(f"필수 컬럼 없음: {', '.join(missing)}")
+    df = raw.reindex(columns=["날짜", "구분", "품목코드", "제품명", "수량"]).fillna("").astype(str).apply(lambda c: c.str.strip())
+    df = df[(df['품목코드'] != "") | (df['수량'] != "")].reset_index(drop=True)  # 엑셀 끝의 빈 행
+    df['품목코드'] = df['품목코드'].str.upper()
+    df.loc[df['날짜'] == "", '날짜'] = str(default_date)
+    df.loc[df['구분'] == "", '구분'] = default_cat
+
+    items = load_data(SHEET_ITEMS, COLS_ITEMS)
+    master = pd.DataFrame({"품목코드": items['품목코드'].astype(object).map(_key_str).str.upper(),
+                           "_name": items['제품명'].astype(str)}).drop_duplicates("품목코드")
+    df = df.merge(master, on="품목코드", how="left")
+    dates = _parse_dates(df['날짜'])
+    qty = pd.to_numeric(df['수량'].str.replace(",", ""), errors='coerce')
+
+    reason = pd.Series("", index=df.index)
+    reason[df['_name'].isna()] = "미등록 품목코드"
+    reason[~df['구분'].isin(PROD_CATS)] = "공정 구분 오류"
+    reason[dates.isna()] = "날짜 형식 오류"
+    reason[~(qty > 0) | (qty % 1 != 0)] = "수량 오류"
+    ok = reason == ""
+
+    df['제품명'] = df['제품명'].where(df['제품명'] != "", df['_name'])
+    err = df.loc[~ok, ["날짜", "구분", "품목코드", "제품명", "수량"]].assign(사유=reason[~ok])
+    good = df.loc[ok, ["구분", "품목코드", "제품명"]].assign(날짜=dates[ok].dt.strftime("%Y-%m-%d"), 수량=qty[ok].astype(int))
+    return good[["날짜", "구분", "품목코드", "제품명", "수량"]].reset_index(drop=True), err
+
+def import_production(df, user, deduct=True):
+    """검증된 실적 프레임 일괄 저장 → (저장한 실적 행 수, 재고 반영에 실패한 품목코드 목록). 실적 저장 실패 시 (0, []).
+    실적은 한 번에 먼저 추가하고, 재고는 품목코드별 증감을 합산해 코드당 한 번만 반영, 재고 이력도 한 번에 추가.
+    실적이 저장된 뒤에는 재고/이력 반영이 실패해도 저장 건수는 그대로 보고 (재고만 따로 보정하도록)"""
+    if df.empty: return 0, []
+    seeded = INVENTORY_MODE != "ledger" or seed_inventory_ledger()  # 이력 시각보다 먼저 기록되도록 맨 앞에서
+    try:
+        now_kst = get_now()
+        recs = df.assign(입력시간=str(now_kst), 작성자=user)
+        recs[COL_ID] = [new_row_id() for _ in range(len(recs))]
+        headers, rows = _frame_rows(SHEET_RECORDS, recs, COLS_RECORDS)
+        if not _append(SHEET_RECORDS, headers, rows, COLS_RECORDS): return 0, []
+    except: return 0, []
+
+    saved, inv = len(rows), df[df['구분'] != "배전"]
+    codes = list(dict.fromkeys(inv['품목코드']))
+    if not seeded: return saved, codes
+    try:
+        out = inv['구분'].isin(OUT_CATS) & deduct
+        moves = pd.DataFrame({"품목코드": inv['품목코드'], "제품명": inv['제품명'],
+                              "비고": pd.Series(np.where(out, "생산출고(", "생산입고("), index=inv.index) + inv['구분'] + ")",
+                              "수량": inv['수량'].where(~out, -inv['수량'])})
+        hist = moves.groupby(["품목코드", "비고"], sort=False).agg(제품명=("제품명", "first"), 수량=("수량", "sum")).reset_index()
+        hist = hist[hist['수량'] != 0]
+        if hist.empty: return saved, []
+        if INVENTORY_MODE != "ledger":
+            net = hist.groupby("품목코드", sort=False).agg(제품명=("제품명", "first"), 수량=("수량", "sum"))
+            store = get_store()
+            with store.lock:
+                if not _update_inventory_rows(store, [(c, n, int(q)) for c, n, q in zip(net.index, net['제품명'], net['수량']) if q]): return saved, codes
+        hist = hist.assign(날짜=now_kst.strftime("%Y-%m-%d"), 구분=np.where(hist['수량'] > 0, "입고", "출고"), 작성자=user, 입력시간=str(now_kst))
+        h_headers, h_rows = _frame_rows(SHEET_INV_HISTORY, hist, COLS_INV_HISTORY)
+        if not _append(SHEET_INV_HISTORY, h_headers, h_rows): return saved, codes
+        if INVENTORY_MODE == "ledger": maybe_compact_inventory()
+        return saved, []
+    except: return saved, codes
+
+def _to_kst_naive(s):
+    # 입력시간은 str(get_now()) 형식(+09:00) → 오프셋을 떼고 KST 기준 naive datetime으로 비교
+    # 마이크로초 유무가 섞여 있으므로 첫 값으로 형식을 추정하지 않음 (format='mixed')
+    return pd.to_datetime(s.astype(str).str.replace(r"[+-]\d{2}:\d{2}$", "", regex=True), errors='coerce', format='mixed')
+
+def _compute_stock(snap, hist, items, until=None, opening=None):
+    """최신 스냅샷(until 이전) + 스냅샷 이후 이력 증감 합계 (품목코드별). until은 KST naive Timestamp(미포함)
+    until 이전 스냅샷이 없으면 가장 이른 스냅샷에서 그 사이 이력을 되돌려 계산.
+    스냅샷이 아예 없으면(ledger 전환 직후) opening(inventory_data 현재고, 이전 이력이 이미 반영된 값)을 그대로 사용.
+    snap/hist/opening은 load_data의 타입 적용 프레임 (시각은 datetime64, 수량/현재고는 정수)"""
+    base = pd.Series(dtype=float)
+    names = {}
+    snap_time, sign = None, 1
+    t = snap['스냅샷시간'] if not snap.empty else pd.Series(dtype="datetime64[ns]")
+    if t.notna().any():
+        valid = t if until is None else t[t < until]
+        if valid.notna().any(): snap_time = valid.max()
+        else: snap_time, sign = t.min(), -1
+        cur = snap[t == snap_time]
+        base = cur['현재고'].groupby(cur['품목코드'].astype(str)).sum()
+        names = dict(zip(cur['품목코드'].astype(str), cur['제품명']))
+    elif opening is not None and not opening.empty:
+        base = opening['현재고'].groupby(opening['품목코드'].astype(str)).sum()
+        names = dict(zip(opening['품목코드'].astype(str), opening['제품명']))
+        hist = hist.iloc[0:0]  # 전환 전 이력은 현재고에 이미 반영됨
+    if not hist.empty:
+        t = hist['입력시간'].fillna(hist['날짜'])
+        mask = t.notna()
+        if sign < 0: mask &= (t >= until) & (t <= snap_time)
+        else:
+            if snap_time is not None: mask &= t > snap_time
+            if until is not None: mask &= t < until
+        h = hist[mask]
+        delta = h['수량'].groupby(h['품목코드'].astype(str)).sum()
+        base = base.add(sign * delta, fill_value=0)
+    base = base[base.index != ""]
+    if not items.empty:
+        for k, v in zip(items['품목코드'].astype(str), items['제품명']): names.setdefault(k, v)
+    stock = base.astype(int).rename("현재고").rename_axis("품목코드").reset_index()
+    stock.insert(1, "제품명", stock['품목코드'].map(names).fillna(""))
+    return stock[["품목코드", "제품명", "현재고"]]
+
+@depends_on(SHEET_INV_SNAPSHOT, SHEET_INV_HISTORY, SHEET_ITEMS, SHEET_INVENTORY)
+@st.cache_data(ttl=CACHE_TTL, max_entries=32)
+def get_stock(version, as_of=None):
+    """ledger 재고 조회. as_of(날짜)를 주면 그 날 마감 시점의 재고"""
+    until = pd.Timestamp(as_of) + pd.Timedelta(days=1) if as_of else None
+    return _compute_stock(load_data(SHEET_INV_SNAPSHOT, COLS_INV_SNAPSHOT), load_data(SHEET_INV_HISTORY, COLS_INV_HISTORY),
+                          load_data(SHEET_ITEMS, COLS_ITEMS), until, load_data(SHEET_INVENTORY, COLS_INVENTORY))
+
+# 재고 조회에 필요한 시트 (prefetch용). ledger는 첫 스냅샷 전까지 inventory_data를 기초 재고로 사용
+INVENTORY_SHEETS = [SHEET_INV_SNAPSHOT, SHEET_INV_HISTORY, SHEET_INVENTORY] if INVENTORY_MODE == "ledger" else [SHEET_INVENTORY]
+
+def load_inventory(as_of=None):
+    """재고 방식(INVENTORY_MODE)에 관계없이 현재고 프레임 (품목코드/제품명/현재고). as_of(날짜)를 주면 그 날 마감 시점 재고.
+    table 모드는 현재고만 저장하므로 as_of 다음 날부터의 inventory_history 증감을 현재고에서 되돌려 계산"""
+    if INVENTORY_MODE == "ledger": return get_stock(as_of)
+    df = load_data(SHEET_INVENTORY, COLS_INVENTORY)
+    if as_of is None or df.empty or pd.Timestamp(as_of) >= pd.Timestamp(get_now().date()): return df
+    hist = load_data(SHEET_INV_HISTORY, COLS_INV_HISTORY)
+    later = hist[hist['날짜'] > pd.Timestamp(as_of)]
+    if later.empty: return df
+    delta = later.groupby(later['품목코드'].astype(str))['수량'].sum()
+    return df.assign(현재고=df['현재고'] - df['품목코드'].astype(str).map(delta).fillna(0).astype(int))
+
+def seed_inventory_ledger():
+    """ledger 전환 후 첫 스냅샷: 스냅샷이 없으면 inventory_data의 현재고를 지금 시각으로 기록 (기초 재고 보존).
+    재고 이력을 추가하기 전에 호출 → 이후 이력만 이 스냅샷 위에 누적. 기록할 필요가 없거나 성공하면 True"""
+    snap = load_data(SHEET_INV_SNAPSHOT, COLS_INV_SNAPSHOT)
+    if not snap.empty and snap['스냅샷시간'].notna().any(): return True
+    inv = load_data(SHEET_INVENTORY, COLS_INVENTORY)
+    inv = inv[(inv['품목코드'].astype(str) != "") & (inv['현재고'] != 0)]
+    if inv.empty: return True
+    now_kst = get_now()
+    return append_rows([[str(now_kst), c, n, int(q)] for c, n, q in zip(inv['품목코드'], inv['제품명'], inv['현재고'])],
+                       SHEET_INV_SNAPSHOT, COLS_INV_SNAPSHOT)
+
+def compact_inventory():
+    """현재 재고를 새 스냅샷으로 기록 → 이후 계산은 이 시점 이후 이력만 누적"""
+    now_kst = get_now()
+    until = _to_kst_naive(pd.Series([str(now_kst)])).iloc[0] + pd.Timedelta(microseconds=1)
+    stock = _compute_stock(load_data(SHEET_INV_SNAPSHOT, COLS_INV_SNAPSHOT), load_data(SHEET_INV_HISTORY, COLS_INV_HISTORY),
+                           load_data(SHEET_ITEMS, COLS_ITEMS), until, load_data(SHEET_INVENTORY, COLS_INVENTORY))
+    stock = stock[stock['현재고'] != 0]
+    rows = [[str(now_kst), c, n, int(q)] for c, n, q in zip(stock['품목코드'], stock['제품명'], stock['현재고'])]
+    if not rows: rows = [[str(now_kst), "", "", 0]]  # 재고가 없어도 스냅샷 시점은 남김
+    return append_rows(rows, SHEET_INV_SNAPSHOT, COLS_INV_SNAPSHOT)
+
+def maybe_compact_inventory():
+    snap = load_data(SHEET_INV_SNAPSHOT, COLS_INV_SNAPSHOT)
+    last = snap['스냅샷시간'].max() if not snap.empty else None
+    now = _to_kst_naive(pd.Series([str(get_now())])).iloc[0]
+    if last is None or pd.isna(last) or (now - last).total_seconds() > INV_SNAPSHOT_SEC:
+        compact_inventory()
+
+def partition_name(sheet_name, month):
+    return f"{sheet_name}{PARTITION_SEP}{month}"
+
+def partition_months(sheet_name):
+    """보관된 월 목록 ["YYYY-MM", ...] (오래된 순)"""
+    return _partition_months(sheet_name, data_version(sheet_name))
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=16)
+def _partition_months(sheet_name, version):
+    try: names = get_backend().list_sheets()
+    except: return []
+    prefix = sheet_name + PARTITION_SEP
+    return sorted(n[len(prefix):] for n in names if n.startswith(prefix))
+
+def archive_closed_months(sheet_name, keep_months=ARCHIVE_KEEP_MONTHS):
+    """이번 달과 최근 keep_months개월 이전의 행을 월별 파티션으로 옮기고 hot 시트에서 삭제 → 옮긴 행 수.
+    파티션 추가가 실패한 월은 hot 시트에 그대로 남김 (다음 실행 때 다시 시도)"""
+    col, cols = ARCHIVE_SHEETS[sheet_name], SHEET_COLS[sheet_name]
+    backend, store = get_backend(), get_store()
+    flush_writes(sheet_name)
+    cutoff = (pd.Timestamp(get_now().date()).to_period("M") - keep_months).to_timestamp()
+    with store.lock:
+        df = store.get(sheet_name, cols)
+        if df is None or df.empty: return 0
+        header = backend.header(sheet_name, cols) or cols
+        dates = _parse_dates(df[col])
+        old = df[(dates < cutoff) & (df.index >= 0)]
+        if old.empty: return 0
+        moved = []
+        for month, part in old.groupby(dates[old.index].dt.strftime("%Y-%m")):
+            target = partition_name(sheet_name, month)
+            p_header = backend.header(target, header) or header
+            rows = [[_cell_value(v) for v in r] for r in part.reindex(columns=p_header, fill_value="").itertuples(index=False)]
+            if not _append(target, p_header, rows, cols, queued=False): break
+            moved += list(part.index)
+        if not moved: return 0
+        try:
+            if not backend.delete_rows(sheet_name, moved): return 0
+            store.patch_delete(sheet_name, moved, backend.shifts_on_delete)
+        except:
+            store.drop(sheet_name)
+            return 0
+    invalidate(sheet_name)
+    return len(moved)
+
+def query_range(sheet_name, start=None, end=None):
+    """날짜 범위 [start, end] 조회: hot 시트 + 범위와 겹치는 월 파티션만 읽어서 합침 (타입 적용 프레임)"""
+    col = ARCHIVE_SHEETS[sheet_name]
+    start = pd.Timestamp(start) if start else None
+    end = pd.Timestamp(end) if end else None
+    df = _with_partitions(sheet_name, _overlapping_months(sheet_name, start, end))
+    mask = df[col].notna()
+    if start is not None: mask &= df[col] >= start
+    if end is not None: mask &= df[col] <= end
+    return df[mask]
+
+def _overlapping_months(sheet_name, start=None, end=None):
+    """[start, end]와 겹치는 보관 월 (None은 제한 없음)"""
+    return tuple(m for m in partition_months(sheet_name)
+                 if (start is None or pd.Period(m, "M").end_time >= start) and (end is None or pd.Period(m, "M").start_time <= end))
+
+def _with_partitions(sheet_name, months):
+    """hot 시트 + 지정한 월 파티션을 합친 프레임"""
+    cols = SHEET_COLS[sheet_name]
+    df = load_data(sheet_name, cols)
+    if months:
+        # 파티션 이동 도중 중단되어 양쪽에 남은 행은 레코드ID로 한 번만 (ID가 없는 시트는 행 전체 비교), 월별로 달라진 category는 다시 통일
+        df = pd.concat([df] + [load_data(partition_name(sheet_name, m), cols) for m in months], ignore_index=True)
+        if COL_ID in df.columns: df = df[~(df[COL_ID].duplicated() & (df[COL_ID].astype(str) != ""))]
+        else: df = df.drop_duplicates()
+        for c, kind in SHEET_SCHEMAS[sheet_name].items():
+            if kind == "cat" and c in df.columns: df[c] = df[c].astype(str).astype("category")
+    return df
+
+SMT_CATS = ["PC", "CM1", "CM3", "배전"]
+
+@st.cache_resource(max_entries=4)
+def _records_sorted(version, months=()):
+    """생산 실적 (hot 시트 + 지정한 월 파티션)을 날짜순 DatetimeIndex로 정렬한 프레임.
+    세션 간 복사 없이 공유하므로 호출 측은 슬라이스/집계만 하고 수정하지 않음"""
+    df = _with_partitions(SHEET_RECORDS, months).dropna(subset=['날짜']).sort_values('날짜', kind='stable')
+    df.index = pd.DatetimeIndex(df['날짜'].values)
+    return df
+
+@depends_on(SHEET_RECORDS)
+@st.cache_data(ttl=CACHE_TTL, max_entries=32)
+def analyze_production(version, start, end):
+    """기간 [start, end] 생산 분석: 총량/일평균, 일자×구분 합계, SMT 모델별 순위 (전체 목록, Top-N은 호출 측에서 head).
+    날짜순 색인을 이진 탐색으로 잘라 쓰고, 결과는 (기간, 데이터 버전)별로 메모"""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    df = _records_sorted(version, _overlapping_months(SHEET_RECORDS, start, end)).loc[start:end]
+    total = int(df['수량'].sum())
+    days = df.index.nunique()
+    smt = df[df['구분'].isin(SMT_CATS)]
+    return {
+        "total": total, "avg": total / days if days else 0, "rows": len(df),
+        "daily": df.groupby(['날짜', '구분'], observed=True)['수량'].sum().reset_index(),
+        "smt": smt.groupby('제품명', observed=True)['수량'].sum().reset_index().sort_values('수량', ascending=False, ignore_index=True),
+    }
+
+@depends_on(SHEET_RECORDS)
+@st.cache_data(ttl=CACHE_TTL, max_entries=4)
+def production_week_over_week(version):
+    """최근 7일(마지막 실적일 기준)과 그 전 7일의 건당 평균 생산량 증감률 (%). 비교할 수 없으면 None"""
+    df = _records_sorted(version)
+    if df.empty: return None
+    last = df.index[-1]
+    recent = df.loc[last - timedelta(days=6):]
+    prev = df.loc[last - timedelta(days=13):last - timedelta(days=7)]
+    prev_avg = prev['수량'].mean() if not prev.empty else 0
+    if not prev_avg > 0: return None
+    return (recent['수량'].mean() - prev_avg) / prev_avg * 100
+
+ROLLUP_KEYS = ["날짜", "구분", "품목코드"]
+
+def _rollup_counts(df):
+    """생산 실적 원본 프레임 → {(날짜, 구분, 품목코드): 수량 합계}"""
+    if df.empty or any(c not in df.columns for c in ROLLUP_KEYS + ["수량"]): return {}
+    typed = _apply_schema(df[ROLLUP_KEYS + ["수량"]], SHEET_RECORDS).dropna(subset=["날짜"])
+    g = typed.groupby([typed["날짜"], typed["구분"].astype(str), typed["품목코드"].astype(str)])["수량"].sum()
+    return dict(zip(g.index, g.values.tolist()))
+
+@depends_on(SHEET_RECORDS)
+@st.cache_data(ttl=CACHE_TTL, max_entries=4)
+def get_production_rollup(version):
+    """일자 × 구분 × 품목코드 생산량 합계 (날짜순). 저장소 캐시에서 추가된 행만 이어서 합산하므로
+    KPI/추이/구성비 계산이 전체 실적 행 수가 아닌 그룹 수에 비례"""
+    store = get_store()
+    with store.lock:
+        if store.sync(SHEET_RECORDS, COLS_RECORDS) is None: counts = {}
+        else: counts = dict(store.rollup(SHEET_RECORDS, "daily", _rollup_counts))
+        pending = store.local.get(SHEET_RECORDS)
+        if pending:
+            for k, v in _rollup_counts(pd.concat(pending).fillna("")).items(): counts[k] = counts.get(k, 0) + v
+    df = pd.DataFrame([(*k, v) for k, v in counts.items()], columns=ROLLUP_KEYS + ["수량"])
+    df["날짜"] = pd.to_datetime(df["날짜"])
+    return df.sort_values("날짜", ignore_index=True)
+
+def _key_str(v):
+    """시트에서 숫자로 읽힌 값(101.0)도 같은 문자열 키로 맞춤"""
+    if isinstance(v, float) and v.is_integer(): v = int(v)
+    return str(v).strip()
+
+def check_uid(equip_id, item_name):
+    """점검 항목 키 (입력 위젯 key, 최신 결과 조회에 공통 사용)"""
+    return f"{_key_str(equip_id)}_{_key_str(item_name)}"
+
+# 기준정보 조회 계층: 마스터 시트를 읽기 전용 조회 구조(MappingProxyType / tuple)로 컴파일해 모든 세션이 공유.
+# 해당 시트 버전이 바뀔 때(기준정보 저장 → save_data의 invalidate)만 다시 컴파일
+def _float_or_none(v):
+    try: f = float(str(v).replace(",", "").strip())
+    except: return None
+    return None if f != f else f
+
+@depends_on(SHEET_EQUIPMENT)
+@st.cache_resource(max_entries=2)
+def get_equipment_map(version):
+    """설비 id → 설비명 (시트 순서 유지)"""
+    df = load_data(SHEET_EQUIPMENT, COLS_EQUIPMENT)
+    return MappingProxyType(dict(zip(df['id'], df['name'])))
+
+@depends_on(SHEET_CHECK_MASTER)
+@st.cache_resource(max_entries=2)
+def get_check_spec(version):
+    """라인 → 점검 양식 ((설비명, (항목, ...)), ...). 라인/설비/항목은 마스터 순서.
+    항목은 읽기 전용 dict: 마스터 컬럼 + uid + min/max (min_val/max_val을 실수로 변환, 비어 있거나 숫자가 아니면 None)"""
+    df = load_data(SHEET_CHECK_MASTER, COLS_CHECK_MASTER)
+    spec = {}
+    for line, grp in df.groupby("line", sort=False):
+        spec[line] = tuple(
+            (name, tuple(MappingProxyType({**r, "uid": check_uid(r['equip_id'], r['item_name']),
+                                           "min": _float_or_none(r['min_val']), "max": _float_or_none(r['max_val'])})
+                         for r in g.to_dict('records')))
+            for name, g in grp.groupby("equip_name", sort=False))
+    return MappingProxyType(spec)
+
+def check_lines():
+    return tuple(get_check_spec())
+
+def get_check_items(line):
+    """라인의 점검 항목을 설비별로 묶은 목록 ((설비명, (항목, ...)), ...)"""
+    return get_check_spec().get(line, ())
+
+def check_out_of_range(item, value):
+    """수치 항목 판정: 값이 기준 min/max를 벗어나면 True (숫자로 읽을 수 없으면 False)"""
+    v = _float_or_none(value)
+    if v is None: return False
+    return (item['min'] is not None and v < item['min']) or (item['max'] is not None and v > item['max'])
+
+def _latest_checks(df):
+    """점검 결과 원본 프레임 → {날짜: {(line, 항목 키): 최신 결과}} (timestamp 순으로 마지막 값)"""
+    if df.empty: return {}
+    df = df.reindex(columns=COLS_CHECK_RESULT, fill_value="").fillna("")
+    df = df.assign(_ts=_to_kst_naive(df["timestamp"])).sort_values("_ts", kind="stable")
+    out = {}
+    for d, line, eq, item, val, ox, who, ts, memo in zip(_parse_dates(df["date"]).dt.strftime("%Y-%m-%d"), df["line"], df["equip_id"], df["item_name"],
+                                                         df["value"], df["ox"], df["checker"], df["_ts"], df["비고"]):
+        if not isinstance(d, str) or not d: continue
+        out.setdefault(d, {})[(_key_str(line), check_uid(eq, item))] = {"equip_id": eq, "item_name": item, "value": val, "ox": ox, "checker": who, "timestamp": ts, "비고": memo}
+    return out
+
+def _merge_latest(old, new):
+    # 같은 키는 timestamp가 더 늦거나 같은 결과로 교체
+    for k, rec in new.items():
+        cur = old.get(k)
+        if cur is None or not (rec["timestamp"] < cur["timestamp"]): old[k] = rec
+    return old
+
+def latest_checks(day, line=None):
+    """해당 날짜의 항목별 최신 점검 결과. line을 주면 {항목 키: 결과}, 없으면 {(line, 항목 키): 결과}.
+    결과 = {"equip_id", "item_name", "value", "ox", "checker", "timestamp", "비고"}. 추가 시 이어서 갱신되는 색인이라 이력 길이와 무관"""
+    day = str(day).split()[0]
+    store = get_store()
+    with store.lock:
+        if store.sync(SHEET_CHECK_RESULT, COLS_CHECK_RESULT) is None: res = {}
+        else: res = dict(store.rollup(SHEET_CHECK_RESULT, "latest", _latest_checks, _merge_latest).get(day, {}))
+        pending = store.local.get(SHEET_CHECK_RESULT)
+        if pending: _merge_latest(res, _latest_checks(pd.concat(pending)).get(day, {}))
+    if line is None: return res
+    line = _key_str(line)
+    return {uid: rec for (l, uid), rec in res.items() if l == line}
+
+def _export_parts(sheet_name, start, end):
+    """내보낼 행을 월 파티션 → hot 시트 순으로 하나씩 (기간 필터, 날짜순). 한 번에 한 덩어리만 메모리에 둠.
+    파티션은 저장소에서 바로 읽고 캐시(SheetStore/st.cache_data)에 남기지 않음"""
+    col, cols = EXPORT_SHEETS[sheet_name][0], SHEET_COLS[sheet_name]
+    names = [partition_name(sheet_name, m) for m in _overlapping_months(sheet_name, start, end)] if sheet_name in ARCHIVE_SHEETS else []
+    backend = get_backend()
+    for name in names + [sheet_name]:
+        if name == sheet_name: df = load_data(name, cols)
+        else:
+            raw = backend.read(name)
+            if raw is None: continue
+            df = _apply_schema(_clean_frame(raw, cols), name)
+        df = df[(df[col] >= start) & (df[col] < end + pd.Timedelta(days=1))]
+        if not df.empty: yield df.sort_values(col, kind='stable')
+
+def export_excel(sheet_names, start, end, chunk=EXPORT_CHUNK):
+    """기간 [start, end]의 이력을 시트별 워크시트로 담은 xlsx bytes (download_button에 바로 전달).
+    write-only 워크북에 청크 단위로 행을 흘려 쓰므로 만드는 동안의 메모리 사용량이 거의 일정"""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    wb = Workbook(write_only=True)
+    for sheet in sheet_names:
+        ws = wb.create_sheet(title=EXPORT_SHEETS[sheet][1])
+        cols = [c for c in SHEET_COLS[sheet] if c != COL_ID]
+        ws.append(cols)
+        for part in _export_parts(sheet, start, end):
+            for i in range(0, len(part), chunk):
+                block = part.iloc[i:i + chunk].reindex(columns=cols).astype(object)
+                for row in block.where(block.notna(), None).itertuples(index=False, name=None): ws.append(row)
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        wb.save(path)
+        with open(path, "rb") as f: return f.read()
+    finally: os.remove(path)
 
 # ==========================================
 # 5. 핵심 렌더링 함수 (Tabs)
 # ==========================================
-@st.cache_data(ttl=60)
-def get_dashboard_stats():
-    df_prod = load_data(SHEET_RECORDS, COLS_RECORDS)
-    df_check = load_data(SHEET_CHECK_RESULT, COLS_CHECK_RESULT)
+# 표 공통 컬럼 설정: 레코드ID 숨김, 날짜 컬럼(datetime64)은 날짜만 표시
+TABLE_CONFIG = {COL_ID: None, "날짜": st.column_config.DateColumn(format="YYYY-MM-DD"), "date": st.column_config.DateColumn(format="YYYY-MM-DD")}
+
+@depends_on(SHEET_RECORDS, SHEET_CHECK_RESULT, SHEET_MAINTENANCE)
+@st.cache_data(ttl=60, max_entries=16)
+def get_dashboard_stats(version, day=None):
+    """대시보드 KPI 엔진: 생산 KPI·주간 추이·월간 구성비, 금일 점검/NG, 정비 현황을 (데이터 버전, 날짜)당 한 번만 계산.
+    메인 대시보드와 대시보드 페이지가 같은 결과를 공유 (접속 세션 수와 무관하게 1회 계산)"""
+    prefetch(SHEET_RECORDS, SHEET_CHECK_RESULT, SHEET_MAINTENANCE)
+    roll = get_production_rollup()
     df_maint = load_data(SHEET_MAINTENANCE, COLS_MAINTENANCE)
     
-    today = get_now().replace(tzinfo=None)
-    today_str = today.strftime("%Y-%m-%d")
-    yesterday_str = (today - timedelta(days=1)).strftime("%Y-%m-%d")
+    day = pd.Timestamp(day or get_now().date())
     
-    prod_today = 0
-    if not df_prod.empty:
-        df_prod['날짜'] = pd.to_datetime(df_prod['날짜'], errors='coerce')
-        df_prod['수량'] = pd.to_numeric(df_prod['수량'], errors='coerce').fillna(0)
-        prod_today = df_prod[df_prod['날짜'].dt.strftime("%Y-%m-%d") == today_str]['수량'].sum()
-        prod_yesterday_val = df_prod[df_prod['날짜'].dt.strftime("%Y-%m-%d") == yesterday_str]['수량'].sum()
-        delta_prod = prod_today - prod_yesterday_val
-    else:
-        delta_prod = 0
+    daily = roll.groupby('날짜')['수량'].sum()
+    prod_today = int(daily.get(day, 0))
+    delta_prod = prod_today - int(daily.get(day - timedelta(days=1), 0))
+    # 주간 추이: 최근 7일 일자 × 구분 합계
+    df_trend = roll[(roll['날짜'] > day - timedelta(days=7)) & (roll['날짜'] <= day)].groupby(['날짜', '구분'])['수량'].sum().reset_index()
+    # 월간 구성비: 이번 달 구분별 합계와 비율
+    month = roll[(roll['날짜'] >= day.replace(day=1)) & (roll['날짜'] <= day)]
+    df_month = month.groupby('구분')['수량'].sum().reset_index()
+    if not df_month.empty:
+        df_month['비율'] = (df_month['수량'] / df_month['수량'].sum() * 100).round(1)
+        df_month['Label'] = df_month['수량'].astype(str) + " (" + df_month['비율'].astype(str) + "%)"
+        df_month['DisplayLabel'] = df_month['Label'].where(df_month['비율'] > 3, "")
     
-    check_cnt, ng_cnt, ng_rate = 0, 0, 0.0
-    df_today_unique = pd.DataFrame()
-    if not df_check.empty:
-        df_check['date_only'] = df_check['date'].astype(str).str.split().str[0]
-        df_check['timestamp'] = pd.to_datetime(df_check['timestamp'], errors='coerce')
-        df_today = df_check[df_check['date_only'] == today_str]
-        if not df_today.empty:
-            df_today_unique = df_today.sort_values('timestamp').drop_duplicates(['line', 'equip_id', 'item_name'], keep='last')
-            check_cnt = len(df_today_unique)
-            ng_cnt = len(df_today_unique[df_today_unique['ox'] == 'NG'])
-            if check_cnt > 0: ng_rate = (ng_cnt / check_cnt) * 100
+    # 금일 점검: 항목별 최신 결과 색인에서 조회
+    checks = latest_checks(day)
+    check_cnt = len(checks)
+    df_ng = pd.DataFrame([[line, r['equip_id'], r['item_name'], r['value'], r['checker'], r['비고']] for (line, _), r in checks.items() if r['ox'] == 'NG'],
+                         columns=['line', 'equip_id', 'item_name', 'value', 'checker', '비고'])
+    ng_cnt = len(df_ng)
+    ng_rate = (ng_cnt / check_cnt) * 100 if check_cnt > 0 else 0.0
 
     maint_cnt = 0
+    df_maint_recent = pd.DataFrame(columns=['날짜', '설비명', '작업구분', '작업내용'])
     if not df_maint.empty:
-        maint_cnt = len(df_maint[df_maint['날짜'].astype(str) == today_str])
+        maint_cnt = int((df_maint['날짜'] == day).sum())
+        df_maint_recent = df_maint.sort_values("날짜", ascending=False).head(5)[list(df_maint_recent.columns)]
 
     return {
         "prod_today": prod_today, "delta_prod": delta_prod,
-        "check_cnt": check_cnt, "ng_cnt": ng_cnt, "ng_rate": ng_rate,
-        "maint_cnt": maint_cnt, "df_prod": df_prod, "df_check_unique": df_today_unique,
-        "df_maint": df_maint, "today_dt": today
+        "check_cnt": check_cnt, "ng_cnt": ng_cnt, "ng_rate": ng_rate, "maint_cnt": maint_cnt,
+        "df_trend": df_trend, "df_month": df_month, "df_ng": df_ng, "df_maint_recent": df_maint_recent,
     }
 
+# 메인 화면 전환 시 유지할 입력 위젯 key (렌더링되지 않은 화면의 위젯 상태는 Streamlit이 지우므로 매 실행 시작 시 다시 저장)
+VIEW_STATE_KEYS = {"p_date", "p_cat", "p_code", "p_name", "p_qty", "inv_as_of", "p_rep_date", "p_imp_date", "p_imp_cat", "p_imp_deduct",
+                   "m_date", "m_eq", "m_type", "m_desc", "m_cost", "m_down", "chk_date", "chk_line", "pdf_date"}
+VIEW_STATE_PREFIXES = ("rad_",)
+
+def keep_view_state():
+    for k in list(st.session_state.keys()):
+        if k in VIEW_STATE_KEYS or str(k).startswith(VIEW_STATE_PREFIXES):
+            st.session_state[k] = st.session_state[k]
+
+def item_suggest(code_key, name_key, limit=8):
+    """품목 코드 입력란 아래 추천 목록 (정확히 일치하면 표시 안 함). 고르면 코드/제품명 입력란을 채움"""
+    q = str(st.session_state.get(code_key, "")).strip()
+    if not q: return
+    idx = get_item_index()
+    if q.upper() in idx.names: return
+    hits = idx.search(q, limit)
+    if not hits:
+        st.caption("일치하는 품목이 없습니다.")
+        return
+    def pick():
+        c = st.session_state[f"{code_key}_pick"]
+        if c: st.session_state[code_key], st.session_state[name_key] = c, idx.names[c]
+    st.selectbox("추천 품목", [""] + [c for c, _ in hits], key=f"{code_key}_pick", on_change=pick,
+                 format_func=lambda c: f"{c}  |  {idx.names[c]}" if c else f"'{q}' 검색 결과 {len(hits)}건에서 선택")
+
+def render_production_import(key="p_imp"):
+    """엑셀/CSV 실적 일괄 등록 (검증 결과 미리보기 → 한 번에 저장)"""
+    with st.expander("📂 엑셀/CSV 일괄 등록"):
+        st.caption("컬럼: 날짜, 구분, 품목코드, 제품명, 수량 (날짜·구분이 비어 있으면 아래 기본값, 제품명은 품목 기준정보 사용)")
+        n = st.session_state.setdefault(f"{key}_n", 0)  # 저장 후 업로더 초기화용
+        f = st.file_uploader("파일 선택", type=["xlsx", "xls", "csv"], key=f"{key}_file_{n}")
+        c1, c2, c3 = st.columns(3)
+        st.session_state.setdefault(f"{key}_date", get_now().date())
+        d = c1.date_input("기본 작업 일자", key=f"{key}_date")
+        cat = c2.selectbox("기본 공정", PROD_CATS, key=f"{key}_cat")
+        st.session_state.setdefault(f"{key}_deduct", True)
+        deduct = c3.checkbox("후공정 재고 차감", key=f"{key}_deduct")
+        if f is None: return
+        try: ok, err = prepare_production_import(read_import_file(f), d, cat)
+        except Exception as e:
+            st.error(f"파일을 읽을 수 없습니다: {e}")
+            return
+        st.write(f"정상 {len(ok)}건 / 오류 {len(err)}건")
+        if not err.empty: st.dataframe(err, hide_index=True, use_container_width=True)
+        if not ok.empty:
+            st.dataframe(ok, hide_index=True, use_container_width=True, height=250)
+            if st.button(f"{len(ok)}건 저장", type="primary", key=f"{key}_save"):
+                saved, inv_failed = import_production(ok, st.session_state.user_info['id'], deduct)
+                if not saved: st.error("저장 실패")
+                elif inv_failed:
+                    # 실적은 저장됨 → 다시 저장하면 중복되므로 업로더를 비우고 재고 보정 대상만 안내
+                    st.session_state[f"{key}_n"] = n + 1
+                    st.warning(f"실적 {saved}건은 저장되었지만 재고 반영에 실패했습니다. 재고를 직접 확인·보정해 주세요: {', '.join(map(str, inv_failed))}")
+                else:
+                    st.session_state[f"{key}_n"] = n + 1
+                    st.toast(f"{saved}건 저장되었습니다.", icon="✅")
+                    st.rerun()
+
 def render_dashboard():
     with st.spinner("데이터 분석 중..."):
-        metrics = get_dashboard_stats()
+        metrics = get_dashboard_stats(get_now().date())
         c1, c2, c3 = st.columns(3)
         c1.metric("오늘 생산량", f"{metrics['prod_today']:,.0f} EA", f"{metrics['delta_prod']:,.0f} (전일비)")
         c2.metric("금일 설비 정비", f"{metrics['maint_cnt']} 건", "확인 필요" if metrics['maint_cnt'] > 0 else "정상", delta_color="inverse")
@@ -381,31 +2098,25 @@ def render_dashboard():
         col_g1, col_g2 = st.columns([2, 1])
         with col_g1:
             st.subheader("📈 주간 생산 추이")
-            df_prod = metrics['df_prod']
-            if not df_prod.empty and HAS_ALTAIR:
-                last_7 = metrics['today_dt'] - timedelta(days=7)
-                chart_data = df_prod[df_prod['날짜'] >= last_7]
-                if not chart_data.empty:
-                    agg = chart_data.groupby(['날짜', '구분'])['수량'].sum().reset_index()
-                    chart = alt.Chart(agg).mark_line(point=True).encode(
-                        x=alt.X('날짜:T', axis=alt.Axis(format="%m-%d", title="날짜")),
-                        y=alt.Y('수량:Q', title="생산량"),
-                        color='구분', tooltip=['날짜', '구분', '수량']
-                    ).properties(height=300)
-                    st.altair_chart(chart, use_container_width=True)
-                else: st.info("최근 7일 데이터가 없습니다.")
-            else: st.info("데이터가 없습니다.")
+            agg = metrics['df_trend']
+            if agg.empty: st.info("최근 7일 데이터가 없습니다.")
+            elif HAS_ALTAIR:
+                chart = alt.Chart(agg).mark_line(point=True).encode(
+                    x=alt.X('날짜:T', axis=alt.Axis(format="%m-%d", title="날짜")),
+                    y=alt.Y('수량:Q', title="생산량"),
+                    color='구분', tooltip=['날짜', '구분', '수량']
+                ).properties(height=300)
+                st.altair_chart(chart, use_container_width=True)
         with col_g2:
             st.subheader("🚨 금일 NG 현황")
-            df_ng = metrics['df_check_unique']
-            if not df_ng.empty and metrics['ng_cnt'] > 0:
-                ng_view = df_ng[df_ng['ox'] == 'NG'][['line', 'equip_id', 'item_name', 'value', '비고']]
-                st.dataframe(ng_view, hide_index=True, use_container_width=True)
+            if metrics['ng_cnt'] > 0:
+                st.dataframe(metrics['df_ng'].drop(columns='checker'), hide_index=True, use_container_width=True)
             elif metrics['ng_cnt'] == 0 and metrics['check_cnt'] > 0:
                 st.success("모든 점검이 정상입니다.")
             else: st.info("금일 점검 내역이 없습니다.")
 
 def render_production():
+    prefetch(SHEET_ITEMS, SHEET_RECORDS, *INVENTORY_SHEETS)
     tabs = ["📝 실적 등록", "📦 재고 현황", "📊 생산분석", "📑 보고서"]
     is_admin = st.session_state.user_info['role'] == 'admin'
     if is_admin: tabs.append("⚙️ 품목 기준정보")
@@ -417,47 +2128,52 @@ def render_production():
             if st.session_state.user_info['role'] in ['admin', 'worker']:
                 with st.container(border=True):
                     st.subheader("실적 입력")
-                    item_df = load_data(SHEET_ITEMS, COLS_ITEMS)
-                    date = st.date_input("작업 일자", value=get_now())
-                    cat = st.selectbox("공정", ["PC", "CM1", "CM3", "배전", "샘플", "후공정", "후공정 외주"])
-                    item_map = dict(zip(item_df['품목코드'], item_df['제품명'])) if not item_df.empty else {}
+                    st.session_state.setdefault("p_date", get_now().date())
+                    date = st.date_input("작업 일자", key="p_date")
+                    cat = st.selectbox("공정", PROD_CATS, key="p_cat")
                     def on_code_change():
                         c = st.session_state.p_code.upper().strip()
-                        if c in item_map: st.session_state.p_name = item_map[c]
+                        if c in get_item_index().names: st.session_state.p_name = get_item_index().names[c]
                     code = st.text_input("품목 코드", key="p_code", on_change=on_code_change)
+                    item_suggest("p_code", "p_name")
                     name = st.text_input("제품명", key="p_name")
-                    qty = st.number_input("수량", min_value=1, value=100, key="p_qty")
+                    st.session_state.setdefault("p_qty", 100)
+                    qty = st.number_input("수량", min_value=1, key="p_qty")
                     if st.button("저장", type="primary", use_container_width=True):
                         if name:
                             rec = {"날짜":str(date), "구분":cat, "품목코드":code, "제품명":name, "수량":qty, "입력시간":str(get_now()), "작성자":st.session_state.user_info['id']}
                             append_data(rec, SHEET_RECORDS)
-                            if cat in ["후공정", "후공정 외주"]:
+                            if cat in OUT_CATS:
                                 update_inventory(code, name, -qty, f"생산출고({cat})", st.session_state.user_info['id'])
                             elif cat != "배전":
                                 update_inventory(code, name, qty, f"생산입고({cat})", st.session_state.user_info['id'])
                             st.toast("저장 완료", icon="✅")
                             st.session_state.p_qty = 100
                         else: st.warning("제품명을 입력하세요.")
+                render_production_import()
             else: st.info("읽기 전용 모드입니다.")
         with c2:
             st.subheader("최근 등록 내역")
             df = load_data(SHEET_RECORDS, COLS_RECORDS)
             if not df.empty:
-                st.dataframe(df.sort_values("입력시간", ascending=False).head(20), hide_index=True, use_container_width=True)
+                st.dataframe(df.sort_values("입력시간", ascending=False).head(20), hide_index=True, use_container_width=True, column_config=TABLE_CONFIG)
 
     with sub_tabs[1]:
-        df_inv = load_data(SHEET_INVENTORY, COLS_INVENTORY)
+        st.session_state.setdefault("inv_as_of", get_now().date())
+        as_of = st.date_input("기준일", key="inv_as_of") if INVENTORY_MODE == "ledger" else None
+        df_inv = load_inventory(as_of)
         if not df_inv.empty:
             df_inv = df_inv[df_inv['현재고'] != 0]
-            st.dataframe(df_inv, use_container_width=True)
+            st.dataframe(df_inv, use_container_width=True, column_config=TABLE_CONFIG)
         else: st.info("재고 데이터가 없습니다.")
 
     with sub_tabs[2]:
-        if st.button("분석 실행", key="btn_prod_anl"):
-            df = load_data(SHEET_RECORDS, COLS_RECORDS)
+        today = get_now().date()
+        st.session_state.setdefault("p_anl_range", (today - timedelta(days=29), today))
+        anl_range = st.date_input("기간 선택", key="p_anl_range")  # 선택한 기간과 겹치는 보관 월만 읽음
+        if st.button("분석 실행", key="btn_prod_anl") and isinstance(anl_range, tuple) and len(anl_range) == 2:
+            df = query_range(SHEET_RECORDS, *anl_range)
             if not df.empty:
-                df['날짜'] = pd.to_datetime(df['날짜'], errors='coerce')
-                df['수량'] = pd.to_numeric(df['수량']).fillna(0)
                 grp = df.groupby('제품명')['수량'].sum().reset_index().sort_values('수량', ascending=False)
                 c1, c2 = st.columns([1, 2])
                 with c1: st.dataframe(grp, hide_index=True, use_container_width=True)
@@ -468,17 +2184,12 @@ def render_production():
                     st.altair_chart(chart, use_container_width=True)
 
     with sub_tabs[3]:
-        r_date = st.date_input("보고서 날짜", get_now())
+        st.session_state.setdefault("p_rep_date", get_now().date())
+        r_date = st.date_input("보고서 날짜", key="p_rep_date")
         if st.button("PDF 다운로드", key="btn_prod_pdf"):
-            df = load_data(SHEET_RECORDS, COLS_RECORDS)
-            df_inv = load_data(SHEET_INVENTORY, COLS_INVENTORY)
-            if not df.empty:
-                df['날짜'] = pd.to_datetime(df['날짜']).dt.date
-                target = df[df['날짜'] == r_date]
-                if not target.empty:
-                    pdf_bytes = generate_production_report_pdf(target, df_inv, str(r_date))
-                    if pdf_bytes: st.download_button("다운로드", pdf_bytes, f"Prod_Report_{r_date}.pdf", "application/pdf")
-                else: st.warning("해당 날짜 데이터 없음")
+            pdf_bytes = production_report_pdf(r_date)
+            if pdf_bytes: st.download_button("다운로드", pdf_bytes, f"Prod_Report_{r_date}.pdf", "application/pdf")
+            else: st.warning("해당 날짜 데이터 없음")
 
     if is_admin:
         with sub_tabs[4]:
@@ -490,6 +2201,7 @@ def render_production():
                 st.rerun()
 
 def render_maintenance():
+    prefetch(SHEET_EQUIPMENT, SHEET_MAINTENANCE)
     tabs = ["📝 정비 등록", "📋 이력 조회", "📊 분석 리포트"]
     is_admin = st.session_state.user_info['role'] == 'admin'
     if is_admin: tabs.append("⚙️ 설비 기준정보")
@@ -501,14 +2213,15 @@ def render_maintenance():
             if st.session_state.user_info['role'] in ['admin', 'worker']:
                 with st.container(border=True):
                     st.subheader("정비 내역 등록")
-                    eq_df = load_data(SHEET_EQUIPMENT, COLS_EQUIPMENT)
-                    eq_map = dict(zip(eq_df['id'], eq_df['name'])) if not eq_df.empty else {}
-                    m_date = st.date_input("날짜", value=get_now(), key="m_date")
-                    m_eq = st.selectbox("설비 선택", list(eq_map.keys()), format_func=lambda x: f"[{x}] {eq_map[x]}")
-                    m_type = st.selectbox("작업 구분", ["PM (예방)", "BM (고장)", "CM (개선)"])
-                    m_desc = st.text_area("작업 내용")
-                    m_cost = st.number_input("비용", step=1000)
-                    m_down = st.number_input("비가동 시간(분)", step=10)
+                    eq_map = get_equipment_map()
+                    st.session_state.setdefault("m_date", get_now().date())
+                    if st.session_state.get("m_eq") not in eq_map: st.session_state.pop("m_eq", None)
+                    m_date = st.date_input("날짜", key="m_date")
+                    m_eq = st.selectbox("설비 선택", list(eq_map.keys()), format_func=lambda x: f"[{x}] {eq_map[x]}", key="m_eq")
+                    m_type = st.selectbox("작업 구분", ["PM (예방)", "BM (고장)", "CM (개선)"], key="m_type")
+                    m_desc = st.text_area("작업 내용", key="m_desc")
+                    m_cost = st.number_input("비용", step=1000, key="m_cost")
+                    m_down = st.number_input("비가동 시간(분)", step=10, key="m_down")
                     if st.button("정비 저장", type="primary", use_container_width=True):
                         rec = {"날짜":str(m_date), "설비ID":m_eq, "설비명":eq_map[m_eq], "작업구분":m_type.split()[0], 
                                "작업내용":m_desc, "비용":m_cost, "비가동시간":m_down, "교체부품":"", 
@@ -521,17 +2234,16 @@ def render_maintenance():
             st.subheader("최근 이력")
             df = load_data(SHEET_MAINTENANCE, COLS_MAINTENANCE)
             if not df.empty:
-                st.dataframe(df.sort_values("입력시간", ascending=False).head(20), hide_index=True, use_container_width=True)
+                st.dataframe(df.sort_values("입력시간", ascending=False).head(20), hide_index=True, use_container_width=True, column_config=TABLE_CONFIG)
 
     with sub_tabs[1]:
         df = load_data(SHEET_MAINTENANCE, COLS_MAINTENANCE)
-        st.dataframe(df, use_container_width=True)
+        st.dataframe(df, use_container_width=True, column_config=TABLE_CONFIG)
 
     with sub_tabs[2]:
         if st.button("보전 분석 실행"):
             df = load_data(SHEET_MAINTENANCE, COLS_MAINTENANCE)
             if not df.empty:
-                df['비가동시간'] = pd.to_numeric(df['비가동시간']).fillna(0)
                 top3 = df.groupby('설비명')['비가동시간'].sum().sort_values(ascending=False).head(3)
                 st.error("🚨 비가동 시간 TOP 3 설비")
                 st.table(top3.reset_index())
@@ -546,7 +2258,24 @@ def render_maintenance():
                 save_data(edited, SHEET_EQUIPMENT)
                 st.rerun()
 
+def _check_radio_key(uid, day, line):
+    # 날짜·라인별 위젯 key: 다른 날짜/라인으로 바꾸면 그 날의 최신 결과로 새로 채워짐
+    return f"rad_{uid}_{day}_{line}"
+
+@fragment
+def _check_block(eq_name, items, prev_data, day, line):
+    # 설비 1개 점검 블록: 판정 변경 시 이 블록만 다시 실행
+    with st.container(border=True):
+        st.markdown(f"**{eq_name}**")
+        for row in items:
+            key = _check_radio_key(row['uid'], day, line)
+            st.session_state.setdefault(key, "NG" if prev_data.get(row['uid'], {}).get('ox') == "NG" else "OK")
+            cc1, cc2 = st.columns([3, 1])
+            cc1.write(f"- {row['item_name']} ({row['standard']})")
+            cc2.radio("판정", ["OK", "NG"], key=key, horizontal=True, label_visibility="collapsed")
+
 def render_daily_check():
+    prefetch(SHEET_CHECK_MASTER, SHEET_CHECK_RESULT)
     tabs = ["✍ 점검 입력", "📊 현황", "📄 리포트"]
     is_admin = st.session_state.user_info['role'] == 'admin'
     if is_admin: tabs.append("⚙️ 점검 기준정보")
@@ -554,51 +2283,34 @@ def render_daily_check():
     
     with sub_tabs[0]:
         c1, c2 = st.columns([1, 2])
-        chk_date = c1.date_input("점검일", get_now())
-        df_master = load_data(SHEET_CHECK_MASTER, COLS_CHECK_MASTER)
-        if not df_master.empty:
-            lines = df_master['line'].unique()
-            sel_line = c2.selectbox("라인 선택", lines)
-            df_res = load_data(SHEET_CHECK_RESULT, COLS_CHECK_RESULT)
-            prev_data = {}
-            if not df_res.empty:
-                df_res['date_only'] = df_res['date'].astype(str).str.split().str[0]
-                target = df_res[(df_res['date_only'] == str(chk_date)) & (df_res['line'] == sel_line)]
-                if not target.empty:
-                    target = target.sort_values('timestamp').drop_duplicates(['equip_id', 'item_name'], keep='last')
-                    for _, r in target.iterrows():
-                        prev_data[f"{r['equip_id']}_{r['item_name']}"] = r['ox']
-            line_data = df_master[df_master['line'] == sel_line]
-            form_data = {}
+        st.session_state.setdefault("chk_date", get_now().date())
+        chk_date = c1.date_input("점검일", key="chk_date")
+        lines = list(check_lines())
+        if lines:
+            if st.session_state.get("chk_line") not in lines: st.session_state.pop("chk_line", None)
+            sel_line = c2.selectbox("라인 선택", lines, key="chk_line")
+            prev_data = latest_checks(chk_date, sel_line)
+            groups = get_check_items(sel_line)
             st.markdown("---")
-            for eq_name, grp in line_data.groupby("equip_name"):
-                with st.container(border=True):
-                    st.markdown(f"**{eq_name}**")
-                    for _, row in grp.iterrows():
-                        uid = f"{row['equip_id']}_{row['item_name']}"
-                        prev_ox = prev_data.get(uid, "OK")
-                        idx = 0 if prev_ox == "OK" else 1
-                        cc1, cc2 = st.columns([3, 1])
-                        cc1.write(f"- {row['item_name']} ({row['standard']})")
-                        val = cc2.radio("판정", ["OK", "NG"], key=f"rad_{uid}", index=idx, horizontal=True, label_visibility="collapsed")
-                        form_data[uid] = val
+            for eq_name, items in groups: _check_block(eq_name, items, prev_data, chk_date, sel_line)
             if st.button("점검 결과 저장", type="primary", use_container_width=True):
                 rows = []
                 ts = str(get_now())
                 user = st.session_state.user_info['name']
-                for _, row in line_data.iterrows():
-                    uid = f"{row['equip_id']}_{row['item_name']}"
-                    ox = form_data.get(uid, "OK")
-                    rows.append([str(chk_date), sel_line, row['equip_id'], row['item_name'], "", ox, user, ts, ""])
+                for _, items in groups:
+                    for row in items:
+                        ox = st.session_state.get(_check_radio_key(row['uid'], chk_date, sel_line), "OK")
+                        rows.append([str(chk_date), sel_line, row['equip_id'], row['item_name'], "", ox, user, ts, ""])
                 append_rows(rows, SHEET_CHECK_RESULT, COLS_CHECK_RESULT)
                 st.toast("저장되었습니다.", icon="✅")
                 st.rerun()
 
     with sub_tabs[1]: st.info("현황 대시보드 준비중")
     with sub_tabs[2]:
-        d_date = st.date_input("출력 날짜", get_now(), key="pdf_date")
+        st.session_state.setdefault("pdf_date", get_now().date())
+        d_date = st.date_input("출력 날짜", key="pdf_date")
         if st.button("PDF 생성"):
-            pdf_bytes = generate_all_daily_check_pdf(str(d_date))
+            pdf_bytes = daily_check_report_pdf(d_date)
             if pdf_bytes: st.download_button("다운로드", pdf_bytes, f"Check_{d_date}.pdf", "application/pdf")
             else: st.error("데이터가 없습니다.")
 
@@ -611,27 +2323,122 @@ def render_daily_check():
                 save_data(edited, SHEET_CHECK_MASTER)
                 st.rerun()
 
-def generate_production_report_pdf(df_prod, df_inv, date_str):
+# ==========================================
+# 6. PDF 보고서 (메모리에서 바로 bytes로 렌더링)
+# ==========================================
+def _pdf_bytes(pdf):
+    # fpdf 1.x는 latin-1 문자열, fpdf2는 bytearray를 돌려줌
+    out = pdf.output(dest='S')
+    return out.encode('latin-1') if isinstance(out, str) else bytes(out)
+
+def _pdf_text(df):
+    """프레임 → 셀 문자열 행 목록. 열 단위로 한 번에 변환 (빈 값은 "", Arial로 표현할 수 없는 문자는 ?)"""
+    df = df.astype(object).where(df.notna(), "").astype(str)
+    return df.apply(lambda c: c.str.encode('latin-1', 'replace').str.decode('latin-1')).values.tolist()
+
+def _pdf_table(pdf, df, headers, widths):
+    pdf.set_font("Arial", "B", 9)
+    for h, w in zip(headers, widths): pdf.cell(w, 7, h, 1, 0, 'C')
+    pdf.ln()
+    pdf.set_font("Arial", "", 9)
+    for row in _pdf_text(df):
+        for v, w in zip(row, widths): pdf.cell(w, 7, v, 1, 0)
+        pdf.ln()
+
+def _new_pdf(title):
     pdf = FPDF()
+    pdf.set_auto_page_break(True, 15)
     pdf.add_page()
     pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, f"Production Report ({date_str})", 0, 1, 'C')
+    pdf.cell(0, 10, title, 0, 1, 'C')
     pdf.set_font("Arial", "", 10)
-    pdf.ln(10)
+    return pdf
+
+def generate_production_report_pdf(df_prod, df_inv, date_str):
+    """생산 보고서 렌더링 (실적 표 + 구분별 합계 + 재고 현황) → PDF bytes"""
+    pdf = _new_pdf(f"Production Report ({date_str})")
+    pdf.ln(5)
     pdf.cell(0, 10, "1. Production Result", 0, 1)
     if not df_prod.empty:
-        for _, row in df_prod.iterrows():
-            line = f"[{row['구분']}] {row['제품명']} : {row['수량']}"
-            pdf.cell(0, 8, line.encode('latin-1', 'replace').decode('latin-1'), 1, 1)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        pdf.output(tmp.name)
-        with open(tmp.name, "rb") as f: return f.read()
-
-def generate_all_daily_check_pdf(date_str):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, f"Daily Check Report ({date_str})", 0, 1, 'C')
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        pdf.output(tmp.name)
-        with open(tmp.name, "rb") as f: return f.read()
\ No newline at end of file
+        _pdf_table(pdf, df_prod[['구분', '품목코드', '제품명', '수량']], ["Type", "Code", "Product", "Qty"], [30, 40, 90, 30])
+        pdf.ln(4)
+        summary = df_prod.groupby('구분', observed=True)['수량'].sum().reset_index()
+        _pdf_table(pdf, summary, ["Type", "Total"], [30, 30])
+        pdf.set_font("Arial", "B", 10)
+        pdf.cell(0, 8, f"Total: {int(df_prod['수량'].sum()):,} EA", 0, 1)
+    pdf.ln(5)
+    pdf.set_font("Arial", "", 10)
+    pdf.cell(0, 10, "2. Inventory", 0, 1)
+    if df_inv is not None and not df_inv.empty:
+        _pdf_table(pdf, df_inv[['품목코드', '제품명', '현재고']], ["Code", "Product", "Stock"], [40, 110, 40])
+    return _pdf_bytes(pdf)
+
+def generate_daily_check_pdf(date_str, sections):
+    """일일점검 보고서 렌더링. sections = [(라인, 항목 프레임)] → 라인마다 한 페이지 이상, PDF bytes"""
+    pdf = _new_pdf(f"Daily Check Report ({date_str})")
+    for i, (line, df) in enumerate(sections):
+        if i: pdf.add_page()
+        done, ng = int((df['ox'] != "-").sum()), int((df['ox'] == "NG").sum())
+        pdf.set_font("Arial", "B", 12)
+        pdf.cell(0, 10, f"Line: {line}  (checked {done}/{len(df)}, NG {ng})".encode('latin-1', 'replace').decode('latin-1'), 0, 1)
+        _pdf_table(pdf, df[['equip_name', 'item_name', 'standard', 'value', 'ox', 'checker']],
+                   ["Equipment", "Item", "Standard", "Value", "O/X", "Checker"], [35, 45, 40, 25, 15, 30])
+    return _pdf_bytes(pdf)
+
+def _report_inventory(day):
+    df_inv = load_inventory(day)
+    return df_inv[df_inv['현재고'] != 0] if not df_inv.empty else df_inv
+
+def _daily_check_sections(day, line=None, results=None):
+    """점검 마스터 × 해당 날짜 최신 결과 → [(라인, 항목 프레임)]. 점검 결과가 하나도 없으면 [].
+    결과는 보관된 월 파티션까지 포함해 읽음 (results: 이미 조회한 그 날의 점검 결과 프레임)"""
+    if results is None: results = query_range(SHEET_CHECK_RESULT, day, day)
+    latest = _latest_checks(results.astype(object)).get(pd.Timestamp(day).strftime("%Y-%m-%d"), {})
+    master = load_data(SHEET_CHECK_MASTER, COLS_CHECK_MASTER)
+    if not latest or master.empty: return []
+    master = master.assign(_line=master['line'].astype(object).map(_key_str),
+                           uid=master['equip_id'].astype(object).map(_key_str) + "_" + master['item_name'].astype(object).map(_key_str))
+    if line is not None: master = master[master['_line'] == _key_str(line)]
+    res = pd.DataFrame([(l, u, r['value'], r['ox'], r['checker']) for (l, u), r in latest.items()],
+                       columns=['_line', 'uid', 'value', 'ox', 'checker'])
+    df = master.merge(res, on=['_line', 'uid'], how='left')
+    df['ox'] = df['ox'].fillna("-")
+    return [(l, g) for l, g in df.groupby('line', sort=False, observed=True)]
+
+@depends_on(SHEET_RECORDS, SHEET_ITEMS, SHEET_INV_HISTORY, *INVENTORY_SHEETS)
+@st.cache_data(ttl=CACHE_TTL, max_entries=32)
+def production_report_pdf(version, day):
+    """일일 생산 보고서 PDF (해당 날짜 실적 + 그날 마감 재고). (날짜, 원본 시트 버전)별 캐시, 실적이 없으면 None"""
+    daily = query_range(SHEET_RECORDS, day, day)
+    if daily.empty: return None
+    return generate_production_report_pdf(daily, _report_inventory(day), str(day))
+
+@depends_on(SHEET_CHECK_MASTER, SHEET_CHECK_RESULT)
+@st.cache_data(ttl=CACHE_TTL, max_entries=32)
+def daily_check_report_pdf(version, day, line=None):
+    """일일점검 보고서 PDF (line이 없으면 전 라인). (날짜, 라인, 원본 시트 버전)별 캐시, 점검 결과가 없으면 None"""
+    sections = _daily_check_sections(day, line)
+    return generate_daily_check_pdf(str(day), sections) if sections else None
+
+@depends_on(SHEET_RECORDS, SHEET_ITEMS, SHEET_INV_HISTORY, *INVENTORY_SHEETS, SHEET_CHECK_MASTER, SHEET_CHECK_RESULT)
+@st.cache_data(ttl=CACHE_TTL, max_entries=2)
+def month_report_binder(version, month):
+    """월말 감사 바인더: 한 달치 생산/일일점검 보고서 PDF를 묶은 zip bytes (자료가 없으면 None).
+    데이터는 월 단위로 한 번에 모으고, 보고서 하나 렌더링은 수 ms라 프로세스 내에서 차례로 생성"""
+    p = pd.Period(month, "M")
+    days = [d.date() for d in pd.date_range(p.start_time, p.end_time.normalize())]
+    prod = query_range(SHEET_RECORDS, days[0], days[-1])
+    by_day = {d.date(): g for d, g in prod.groupby(prod['날짜'].dt.normalize())}
+    checks = query_range(SHEET_CHECK_RESULT, days[0], days[-1])
+    checks_by_day = {d.date(): g for d, g in checks.groupby(checks['date'].dt.normalize())}
+    buf, n = io.BytesIO(), 0
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for d in days:
+            if d in by_day:
+                zf.writestr(f"Production_{d}.pdf", generate_production_report_pdf(by_day[d], _report_inventory(d), str(d)))
+                n += 1
+            sections = _daily_check_sections(d, results=checks_by_day[d]) if d in checks_by_day else []
+            if sections:
+                zf.writestr(f"Daily_Check_{d}.pdf", generate_daily_check_pdf(str(d), sections))
+                n += 1
+    return buf.getvalue() if n else None